@@ -1,24 +1,445 @@
 # admin.py
 
+import csv
+import io
+import mimetypes
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
 import streamlit as st
 from supabase import Client
 
+import admin_index
+import db
+import documents
+import jobs
+import metrics
+from onboard import DOCUMENT_LABELS, render_document_previews
+
+# Number of users shown per dashboard page.
+ADMIN_PAGE_SIZE = 50
+
+# Bulk actions (see sql/004_admin_bulk_operations.sql) and their labels.
+BULK_ACTIONS = {
+    "mark_reviewed": "Mark reviewed",
+    "set_role": "Set role",
+    "reset_onboarding": "Reset onboarding",
+}
+
+# Users sent per admin_bulk_update call; larger selections take several calls.
+BULK_CHUNK_SIZE = 500
+
+# Rows read per request while exporting.
+EXPORT_PAGE_SIZE = 500
+
+# How long the download link of a finished export stays valid (seconds).
+EXPORT_LINK_TTL_SECONDS = 3600
+
+# Stored exports older than this are deleted when the next export runs (seconds).
+EXPORT_RETENTION_SECONDS = EXPORT_LINK_TTL_SECONDS
+
+# How often the export progress panel refreshes (seconds).
+EXPORT_PROGRESS_REFRESH_SECONDS = 2
+
+# Columns of the exported user table. eFiling passwords are deliberately left out.
+EXPORT_COLUMNS = [
+    "user_id",
+    "contact_name",
+    "contact_details",
+    "company_name",
+    "address",
+    "id_number",
+    "citizenship",
+    "company_tax_number",
+    "email_address",
+    "mobile",
+    "efiling_username",
+    "e_sign",
+    *DOCUMENT_LABELS,
+]
+
+def bulk_update(supabase: Client, action: str, user_ids: list, new_role: str = None) -> list:
+    """
+    Apply a bulk action to many users through the admin_bulk_update RPC, one
+    call per BULK_CHUNK_SIZE users.
+    Returns one {"user_id", "outcome", "detail"} per user, where outcome is
+    "updated", "not_found" or "error" (a failed chunk marks all its users "error").
+    """
+    outcomes = []
+    for start in range(0, len(user_ids), BULK_CHUNK_SIZE):
+        chunk = user_ids[start:start + BULK_CHUNK_SIZE]
+        try:
+            response = supabase.rpc(
+                "admin_bulk_update", {"action": action, "user_ids": chunk, "new_role": new_role}
+            ).execute()
+            outcomes.extend(response.data or [])
+        except Exception as e:
+            outcomes.extend({"user_id": user_id, "outcome": "error", "detail": str(e)} for user_id in chunk)
+    return outcomes
+
+def render_bulk_actions(supabase: Client, selected_user_ids: list, search: str, completeness: str):
+    """
+    Bulk action controls for the selected users (or all users matching the
+    filters) and a summary of the last action's per-user outcomes.
+    """
+    st.subheader("Bulk Actions")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        action = st.selectbox("Action", list(BULK_ACTIONS), format_func=BULK_ACTIONS.get)
+    with col2:
+        new_role = st.selectbox("New Role", ["user", "admin"]) if action == "set_role" else None
+    with col3:
+        scope = st.radio("Apply to", ["Selected users", "All users matching the filters"], key="admin_bulk_scope")
+
+    confirmed = True
+    if action == "reset_onboarding":
+        confirmed = st.checkbox("I understand this deletes the users' onboarding details and document records.")
+
+    if st.button("Apply", disabled=not confirmed or (scope == "Selected users" and not selected_user_ids)):
+        index = _admin_index(supabase)
+        if scope == "Selected users":
+            user_ids = selected_user_ids
+        else:
+            user_ids = index.matching_user_ids(search, completeness)
+        st.session_state["admin_bulk_outcomes"] = (BULK_ACTIONS[action], bulk_update(supabase, action, user_ids, new_role))
+        # Show the result right away instead of waiting for the change feed
+        index.refresh(user_ids)
+        if st.session_state["user_id"] in user_ids:
+            st.session_state["role_stale"] = True
+            db.invalidate(st.session_state["user_id"], "user_onboarding", "user_documents")
+        st.rerun()
+
+    if "admin_bulk_outcomes" in st.session_state:
+        label, outcomes = st.session_state["admin_bulk_outcomes"]
+        counts = Counter(outcome["outcome"] for outcome in outcomes)
+        summary = f"{label}: {counts['updated']} updated, {counts['not_found']} not found, {counts['error']} failed."
+        if counts["error"]:
+            st.error(summary)
+        else:
+            st.success(summary)
+        problems = [outcome for outcome in outcomes if outcome["outcome"] != "updated"]
+        if problems:
+            with st.expander("Show users that were not updated"):
+                st.dataframe(problems, hide_index=True, use_container_width=True)
+
+def _export_row(user: dict, uploads: dict) -> dict:
+    """
+    Flatten a user_onboarding row and its document_uploads row into EXPORT_COLUMNS.
+    """
+    row = {column: user.get(column) for column in EXPORT_COLUMNS}
+    for column in DOCUMENT_LABELS:
+        row[column] = uploads.get(column) or None
+    return row
+
+class _CsvTable:
+    """
+    Writes exported rows as CSV to a temporary file, added to the archive as
+    users.csv on close. (A ZIP takes one open entry at a time, and documents are
+    streamed into the archive while the table is being written.)
+    """
+    def __init__(self, archive: zipfile.ZipFile):
+        self._archive = archive
+        self._file = tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=EXPORT_COLUMNS)
+        self._writer.writeheader()
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.flush()
+        self._archive.write(self._file.name, "users.csv")
+        self._file.close()
+
+class _ParquetTable:
+    """
+    Writes exported rows as Parquet (one row group per page) to a temporary
+    file, added to the archive as users.parquet on close.
+    pyarrow is imported here, on the first Parquet export, rather than with the page.
+    """
+    def __init__(self, archive: zipfile.ZipFile):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([
+            (column, pa.bool_() if column == "e_sign" else pa.string()) for column in EXPORT_COLUMNS
+        ])
+        self._archive = archive
+        self._file = tempfile.NamedTemporaryFile(suffix=".parquet")
+        self._writer = pq.ParquetWriter(self._file.name, self._schema)
+
+    def write(self, rows: list):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+        self._archive.write(self._file.name, "users.parquet")
+        self._file.close()
+
+def _add_documents(supabase: Client, archive: zipfile.ZipFile, user_id: str, uploads: dict, missing: list):
+    """
+    Stream a user's stored documents into documents/<user_id>/ in the archive.
+    Documents that cannot be downloaded are appended to missing.
+    Returns the number of documents added.
+    """
+    added = 0
+    for column, label in DOCUMENT_LABELS.items():
+        url = uploads.get(column)
+        if not url:
+            continue
+        try:
+            with documents.open_document(supabase, url) as response:
+                content_type = response.headers.get("content-type", "").split(";")[0]
+                extension = mimetypes.guess_extension(content_type) or ""
+                with archive.open(f"documents/{user_id}/{label}{extension}", "w", force_zip64=True) as entry:
+                    for chunk in response.iter_bytes(documents.DOWNLOAD_CHUNK_SIZE):
+                        entry.write(chunk)
+            added += 1
+        except Exception as e:
+            missing.append({"user_id": user_id, "document": label, "url": url, "error": str(e)})
+    return added
+
+def _delete_expired_exports(supabase: Client):
+    """
+    Delete every admin's stored exports older than EXPORT_RETENTION_SECONDS,
+    so archives of user data do not outlive their download links.
+    """
+    bucket = supabase.storage.from_(documents.EXPORTS_BUCKET)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_RETENTION_SECONDS)
+    expired = []
+    for folder in bucket.list("", {"limit": 1000}):
+        for item in bucket.list(folder["name"], {"limit": 1000}):
+            created_at = item.get("created_at")
+            if created_at and datetime.fromisoformat(created_at.replace("Z", "+00:00")) < cutoff:
+                expired.append(f"{folder['name']}/{item['name']}")
+    if expired:
+        bucket.remove(expired)
+
+def _run_export_job(context: dict, payload: dict) -> dict:
+    """
+    Job handler: build the export archive on disk and store it in the private
+    exports bucket, after deleting expired exports. Users are read page by page
+    and documents streamed straight into the ZIP, so memory use stays flat
+    however many users are exported.
+    Returns the archive's storage path and what it contains.
+    """
+    # Non-refreshing client: the export must finish while the admin's access token is valid
+    supabase = db.token_client(context["access_token"])
+    _delete_expired_exports(supabase)
+    users, stored, missing = 0, 0, []
+
+    with tempfile.TemporaryFile() as spool:
+        with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            table = _ParquetTable(archive) if payload["format"] == "Parquet" else _CsvTable(archive)
+            page = []
+            for user, uploads in db.iter_onboarding_export(supabase, payload["user_ids"], EXPORT_PAGE_SIZE):
+                users += 1
+                page.append(_export_row(user, uploads))
+                if len(page) == EXPORT_PAGE_SIZE:
+                    table.write(page)
+                    page = []
+                if payload["documents"]:
+                    stored += _add_documents(supabase, archive, user["user_id"], uploads, missing)
+            if page:
+                table.write(page)
+            table.close()
+
+            if missing:
+                with archive.open("missing_documents.csv", "w") as entry:
+                    text = io.TextIOWrapper(entry, encoding="utf-8", newline="")
+                    writer = csv.DictWriter(text, fieldnames=["user_id", "document", "url", "error"])
+                    writer.writeheader()
+                    writer.writerows(missing)
+                    text.close()
+
+        path = f"{context['user_id']}/{payload['name']}"
+        spool.seek(0)
+        documents.upload_resumable(
+            supabase, documents.EXPORTS_BUCKET, path, spool, "application/zip", upsert=True
+        )
+    return {"path": path, "users": users, "documents": stored, "missing": len(missing)}
+
+def _finish_export(context: dict, results: list):
+    """
+    Batch completion: nothing to do, the job stored the archive itself.
+    """
+
+def _export_queue() -> jobs.JobQueue:
+    return jobs.get_queue("admin_exports", _run_export_job, _finish_export)
+
+def _export_context(supabase: Client) -> dict:
+    """
+    Batch context for an export job: the admin and their current access token.
+    """
+    session = supabase.auth.get_session()
+    return {
+        "user_id": st.session_state["user_id"],
+        "access_token": session.access_token if session else None,
+    }
+
+def render_export_section(supabase: Client, selected_user_ids: list):
+    """
+    Export controls: the user table as CSV or Parquet plus, optionally, every
+    stored document, packed into one ZIP by a background job.
+    """
+    st.subheader("Export")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        export_format = st.radio("Format", ["CSV", "Parquet"], horizontal=True)
+    with col2:
+        scope = st.radio("Users", ["Selected users", "All users"], horizontal=True, key="admin_export_scope")
+    with col3:
+        include_documents = st.checkbox("Include documents")
+
+    user_ids = selected_user_ids if scope == "Selected users" else None
+    if scope == "Selected users" and not selected_user_ids:
+        st.caption("Select users in the table above, or export all users.")
+
+    if st.button("Start Export", disabled=user_ids == []):
+        payload = {
+            "format": export_format,
+            "user_ids": user_ids,
+            "documents": include_documents,
+            "name": f"vatify_export_{time.strftime('%Y%m%d_%H%M%S')}.zip",
+        }
+        st.session_state["admin_export_batch"] = _export_queue().submit(_export_context(supabase), [payload])
+        st.session_state.pop("admin_export_link", None)
+
+    render_export_progress(supabase)
+
+@st.fragment(run_every=EXPORT_PROGRESS_REFRESH_SECONDS)
+def render_export_progress(supabase: Client):
+    """
+    Status of the last export started in this session and, once it is ready, a
+    signed download link (created once and kept in session state) and a button
+    deleting the stored archive.
+    """
+    batch_id = st.session_state.get("admin_export_batch")
+    if not batch_id:
+        return
+    status = _export_queue().status(batch_id)
+    if status is None:
+        del st.session_state["admin_export_batch"]
+        return
+
+    job = status["jobs"][0]
+    if status["status"] == "done":
+        result = job["result"]
+        if "admin_export_link" not in st.session_state:
+            signed = supabase.storage.from_(documents.EXPORTS_BUCKET).create_signed_url(
+                result["path"], EXPORT_LINK_TTL_SECONDS
+            )
+            st.session_state["admin_export_link"] = signed["signedURL"]
+        st.success(f"Export ready: {result['users']} users, {result['documents']} documents.")
+        if result["missing"]:
+            st.warning(f"{result['missing']} documents could not be downloaded; see missing_documents.csv in the archive.")
+        st.link_button("Download Export", st.session_state["admin_export_link"])
+        st.caption(f"The export is deleted after {EXPORT_RETENTION_SECONDS // 60} minutes; delete it sooner once downloaded.")
+        if st.button("Delete Export"):
+            supabase.storage.from_(documents.EXPORTS_BUCKET).remove([result["path"]])
+            del st.session_state["admin_export_batch"]
+            st.session_state.pop("admin_export_link", None)
+            st.rerun()
+    elif status["status"] == "failed":
+        st.error(f"Export failed: {job['error'] or status['error']}")
+        if st.button("Retry Export"):
+            _export_queue().retry_failed(batch_id, _export_context(supabase))
+    else:
+        retrying = f" (retrying after error: {job['error']})" if job["error"] else ""
+        st.info(f"Export {job['status']}{retrying}...")
+
+def _admin_index(supabase: Client) -> admin_index.AdminIndex:
+    """
+    The admin index, if the caller is still an admin. Otherwise the session's
+    cached role is dropped and the page reruns without the Admin page.
+    """
+    try:
+        return admin_index.get_admin_index(supabase)
+    except PermissionError:
+        st.session_state["role"] = "user"
+        st.session_state["role_stale"] = True
+        st.rerun()
+
+@metrics.instrument_page("admin")
 def render_admin_dashboard(supabase: Client):
     """
     Displays an admin dashboard with a list of users and their onboarding status.
+    Users are paged and filtered from the process-wide admin index (see
+    admin_index.py), an in-memory copy of the dashboard_summary view kept current
+    by Supabase Realtime or polling, so reruns make no queries for the list.
     """
     st.title("VATIFY: Admin Dashboard")
 
-    # Example: List all users in user_onboarding
-    user_data_response = supabase.table("user_onboarding").select("*").execute()
-    all_users = user_data_response.data if user_data_response.data else []
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        search = st.text_input("Search by name, email or company")
+    with col2:
+        completeness = st.selectbox("Profile", ["All", "Complete", "Incomplete"])
+
+    # Each entry is the last user_id of the page before it; restart paging when filters change.
+    filters = (search, completeness)
+    if st.session_state.get("admin_filters") != filters:
+        st.session_state["admin_filters"] = filters
+        st.session_state["admin_cursors"] = [None]
+    cursors = st.session_state["admin_cursors"]
+
+    # Fetch one extra row to know whether there is a next page.
+    index = _admin_index(supabase)
+    users = index.page(after=cursors[-1], limit=ADMIN_PAGE_SIZE + 1, search=search, completeness=completeness)
+    has_next = len(users) > ADMIN_PAGE_SIZE
+    users = users[:ADMIN_PAGE_SIZE]
 
     st.subheader("All Onboarded Users")
-    if not all_users:
+    if index.realtime_connected:
+        st.caption("Live: changes appear as they happen.")
+    else:
+        st.caption(f"Changes appear within {admin_index.ADMIN_INDEX_POLL_SECONDS:.0f} seconds.")
+    if not users:
         st.info("No users found.")
     else:
-        for user in all_users:
-            st.write(f"- **User ID**: {user['user_id']}")
-            st.write(f"  **Name**: {user['contact_name']}")
-            st.write(f"  **Email**: {user['email_address']}")
-            st.write("---")
+        selection = st.dataframe(
+            users,
+            hide_index=True,
+            use_container_width=True,
+            on_select="rerun",
+            selection_mode="multi-row",
+            column_order=db.ADMIN_LIST_COLUMNS,
+            column_config={
+                "user_id": "User ID",
+                "contact_name": "Name",
+                "email_address": "Email",
+                "company_name": "Company",
+                "documents_uploaded": st.column_config.NumberColumn("Documents", format="%d/4"),
+                "profile_complete": st.column_config.CheckboxColumn("Profile Complete"),
+                "reviewed_at": st.column_config.DatetimeColumn("Reviewed", format="YYYY-MM-DD HH:mm"),
+                "role": "Role",
+            },
+        )
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("← Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with next_col:
+        if st.button("Next →", disabled=not has_next):
+            cursors.append(users[-1]["user_id"])
+            st.rerun()
+
+    selected_user_ids = [users[row]["user_id"] for row in selection.selection.rows if row < len(users)] if users else []
+    if len(selected_user_ids) == 1:
+        with st.expander("Documents of the selected user", expanded=True):
+            uploads = db.fetch_document_uploads(supabase, selected_user_ids[0]) or {}
+            render_document_previews(supabase, uploads)
+
+    st.markdown("---")
+    render_bulk_actions(supabase, selected_user_ids, search, completeness)
+
+    st.markdown("---")
+    render_export_section(supabase, selected_user_ids)
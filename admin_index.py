@@ -0,0 +1,356 @@
+# admin_index.py
+
+import asyncio
+import base64
+import bisect
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from supabase import Client
+
+import db
+
+logger = logging.getLogger("vatify.admin_index")
+
+# How often changed rows are polled by updated_at while Realtime is not connected (seconds).
+ADMIN_INDEX_POLL_SECONDS = 5.0
+
+# Each poll re-reads changes from this long before the previous poll started,
+# covering clock skew and rows committed late by long transactions (seconds).
+ADMIN_INDEX_POLL_OVERLAP_SECONDS = 30.0
+
+# How often the whole index is read again, which also drops users deleted by
+# other processes (seconds).
+ADMIN_INDEX_RESEED_SECONDS = 600.0
+
+# Delay before reconnecting to Realtime after it failed or disconnected (seconds).
+ADMIN_INDEX_REALTIME_RETRY_SECONDS = 60.0
+
+# How often the Realtime thread checks its connection and access token (seconds).
+REALTIME_CHECK_SECONDS = 5.0
+
+# A token this close to expiry is not used; the index waits for an admin's fresh one (seconds).
+TOKEN_EXPIRY_MARGIN_SECONDS = 60.0
+
+# Tables whose changes are streamed from Realtime (see sql/007_admin_change_feed.sql).
+CHANGE_TABLES = tuple(db.SUMMARY_CHANGE_COLUMNS)
+
+# Rows read per request when seeding the index.
+SEED_PAGE_SIZE = 500
+
+# Changed rows read per table per poll; a poll finding more reseeds the index instead.
+POLL_LIMIT = 1000
+
+# Users re-read per request (their ids go in the URL).
+REFRESH_CHUNK_SIZE = 100
+
+
+def _token_claims(access_token: str) -> dict:
+    """
+    The payload of a Supabase access token (JWT), unverified: it is only used
+    to tell when the token expires and whose it is.
+    """
+    payload = access_token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+
+def _matches(row: dict, search: str, completeness: str) -> bool:
+    """
+    The filters of db.fetch_users_page, applied to one row in memory.
+    """
+    if search:
+        needle = search.lower()
+        columns = ("contact_name", "email_address", "company_name")
+        if not any(needle in (row.get(column) or "").lower() for column in columns):
+            return False
+    if completeness == "Complete":
+        return row.get("profile_complete") is True
+    if completeness == "Incomplete":
+        return row.get("profile_complete") is False
+    return True
+
+
+class AdminIndex:
+    """
+    In-memory copy of every user's dashboard_summary row (db.ADMIN_INDEX_COLUMNS),
+    shared by all admin sessions of the process, so admin reruns cost no queries.
+    It is read in full once, then kept current by a background thread: users
+    whose rows Supabase Realtime reports as changed are re-read, and while
+    Realtime is not connected (e.g. against a local stand-in) the users whose
+    rows changed since the last poll are found every ADMIN_INDEX_POLL_SECONDS
+    through the base tables' change times and re-read.
+    The whole index is read again every ADMIN_INDEX_RESEED_SECONDS.
+    The index reads with the access token of the admin who used it last (see
+    use_token), through a client that never refreshes it, so the admin's own
+    session keeps the only refresh token. It waits while that token is expired
+    and drops it once its owner is seen to be no longer an admin, until an
+    admin opens the dashboard again.
+    If a background read fails the index is marked failed; get_admin_index then
+    builds a new one.
+    """
+    def __init__(self, access_token: str):
+        self.supabase = None
+        self.failed = False
+        self.realtime_connected = False
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._sorted_ids = []
+        self._changed_ids = set()
+        self._catch_up = False
+        self._polled_at = time.time()
+        self._reseed_due = 0.0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._access_token = None
+        self._token_owner = None
+        self._token_expires_at = 0.0
+        self.use_token(access_token)
+        self._seed()
+        threading.Thread(target=self._sync, name="admin-index-sync", daemon=True).start()
+        threading.Thread(target=self._listen, name="admin-index-realtime", daemon=True).start()
+
+    # ----------------- reading (no queries) -----------------
+
+    def page(self, after: str = None, limit: int = 50, search: str = "", completeness: str = "All") -> list:
+        """
+        One page of rows matching the filters in user_id order, starting after
+        the user_id `after` (same arguments as db.fetch_users_page).
+        """
+        rows = []
+        with self._lock:
+            start = bisect.bisect_right(self._sorted_ids, after) if after else 0
+            for user_id in self._sorted_ids[start:]:
+                row = self._rows[user_id]
+                if _matches(row, search, completeness):
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+        return rows
+
+    def matching_user_ids(self, search: str = "", completeness: str = "All") -> list:
+        """
+        The ids of every user matching the filters, in user_id order.
+        """
+        with self._lock:
+            return [user_id for user_id in self._sorted_ids if _matches(self._rows[user_id], search, completeness)]
+
+    # ----------------- credentials -----------------
+
+    def use_token(self, access_token: str):
+        """
+        Read with this access token (the calling admin's current one) from now on.
+        """
+        if not access_token or access_token == self._access_token:
+            return
+        claims = _token_claims(access_token)
+        self.supabase = db.token_client(access_token)
+        self._token_owner = claims.get("sub")
+        self._token_expires_at = float(claims.get("exp", 0))
+        self._access_token = access_token
+        self._wakeup.set()
+
+    def _token_usable(self) -> bool:
+        return self._access_token is not None and time.time() < self._token_expires_at - TOKEN_EXPIRY_MARGIN_SECONDS
+
+    def _owner_still_admin(self, rows: list) -> bool:
+        """
+        False (and the token dropped) if rows show the token's owner is no
+        longer an admin: row level security now limits what the token reads,
+        so the rows must not replace the index's.
+        """
+        for row in rows:
+            if row["user_id"] == self._token_owner and row.get("role") != "admin":
+                logger.info("admin index: token owner is no longer an admin; waiting for another admin")
+                self._access_token = None
+                return False
+        return True
+
+    # ----------------- updating -----------------
+
+    def refresh(self, user_ids):
+        """
+        Re-read the given users now, e.g. after this process changed them.
+        Users that no longer have a dashboard_summary row are dropped.
+        """
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), REFRESH_CHUNK_SIZE):
+            chunk = user_ids[start:start + REFRESH_CHUNK_SIZE]
+            rows = db.fetch_summary_rows(self.supabase, db.ADMIN_INDEX_COLUMNS, chunk)
+            if not self._owner_still_admin(rows):
+                return
+            self._store(rows, replaced=chunk)
+
+    def _store(self, rows: list, replaced: list = ()):
+        with self._lock:
+            for user_id in replaced:
+                self._rows.pop(user_id, None)
+            for row in rows:
+                self._rows[row["user_id"]] = row
+            self._sorted_ids = sorted(self._rows)
+
+    def _seed(self):
+        """
+        Read every row, one keyset page at a time, and replace the index with them.
+        """
+        started = time.time()
+        rows, after = [], None
+        while True:
+            page = db.fetch_users_page(self.supabase, db.ADMIN_INDEX_COLUMNS, after=after, limit=SEED_PAGE_SIZE)
+            rows.extend(page)
+            if len(page) < SEED_PAGE_SIZE:
+                break
+            after = page[-1]["user_id"]
+        if not self._owner_still_admin(rows):
+            return
+        with self._lock:
+            self._rows = {row["user_id"]: row for row in rows}
+            self._sorted_ids = sorted(self._rows)
+            self._polled_at = started
+            self._reseed_due = time.monotonic() + ADMIN_INDEX_RESEED_SECONDS
+
+    def _poll(self):
+        """
+        Re-read the users whose details, documents or role changed since shortly
+        before the previous poll, found through each base table's indexed change
+        time (filtering the view's computed updated_at would evaluate all of it).
+        Deleted rows are not seen here; they drop out at the next reseed, as do
+        changes beyond POLL_LIMIT per table, which reseed right away.
+        """
+        started = time.time()
+        since = datetime.fromtimestamp(self._polled_at - ADMIN_INDEX_POLL_OVERLAP_SECONDS, timezone.utc).isoformat()
+        changed = set()
+        for table in CHANGE_TABLES:
+            user_ids = db.fetch_changed_user_ids(self.supabase, table, since, POLL_LIMIT)
+            if len(user_ids) == POLL_LIMIT:
+                self._seed()
+                return
+            changed.update(user_ids)
+        self.refresh(changed)
+        self._polled_at = started
+
+    def _sync(self):
+        """
+        Background thread applying changes until a read fails.
+        """
+        while not self._stopped.is_set():
+            self._wakeup.wait(ADMIN_INDEX_POLL_SECONDS)
+            self._wakeup.clear()
+            if not self._token_usable():
+                continue
+            try:
+                if time.monotonic() >= self._reseed_due:
+                    self._seed()
+                elif self._catch_up or not self.realtime_connected:
+                    # After (re)subscribing, pick up what changed while disconnected
+                    self._catch_up = False
+                    self._poll()
+                with self._lock:
+                    changed, self._changed_ids = self._changed_ids, set()
+                if changed:
+                    self.refresh(changed)
+            except Exception as e:
+                logger.warning("admin index stopped after a failed read: %s", e)
+                self.failed = True
+                self._stopped.set()
+
+    # ----------------- Realtime -----------------
+
+    def _on_change(self, payload: dict):
+        """
+        Realtime callback: queue the changed row's user for re-reading.
+        """
+        data = payload["data"]
+        user_id = (data.get("record") or {}).get("user_id") or (data.get("old_record") or {}).get("user_id")
+        with self._lock:
+            if user_id:
+                self._changed_ids.add(user_id)
+            else:
+                # A delete whose old record only carries another primary key
+                self._reseed_due = 0.0
+        self._wakeup.set()
+
+    def _listen(self):
+        """
+        Background thread holding the Realtime subscription, reconnecting after
+        ADMIN_INDEX_REALTIME_RETRY_SECONDS whenever it fails or drops.
+        """
+        while not self._stopped.is_set():
+            if not self._token_usable():
+                self._stopped.wait(REALTIME_CHECK_SECONDS)
+                continue
+            try:
+                asyncio.run(self._subscribe())
+            except Exception as e:
+                logger.info("admin index: Realtime unavailable (%s), polling every %ss", e, ADMIN_INDEX_POLL_SECONDS)
+            self.realtime_connected = False
+            self._stopped.wait(ADMIN_INDEX_REALTIME_RETRY_SECONDS)
+
+    async def _subscribe(self):
+        # Only this thread uses Realtime, so its client is imported here
+        from realtime import AsyncRealtimeClient, RealtimePostgresChangesListenEvent, RealtimeSubscribeStates
+
+        client = AsyncRealtimeClient(
+            f"{db.SUPABASE_URL}/realtime/v1", db.SUPABASE_KEY, auto_reconnect=False, max_retries=1
+        )
+        token = self._access_token
+        await client.set_auth(token)
+        channel = client.channel("admin-index")
+        for table in CHANGE_TABLES:
+            channel.on_postgres_changes(
+                RealtimePostgresChangesListenEvent.All, self._on_change, table=table, schema="public"
+            )
+
+        subscribed = asyncio.get_running_loop().create_future()
+
+        def on_subscribe(state, error):
+            if not subscribed.done():
+                subscribed.set_result((state, error))
+
+        try:
+            await channel.subscribe(on_subscribe)
+            state, error = await asyncio.wait_for(subscribed, client.timeout)
+            if state != RealtimeSubscribeStates.SUBSCRIBED:
+                raise error or RuntimeError(state)
+            self.realtime_connected = True
+            self._catch_up = True
+            self._wakeup.set()
+            while client.is_connected and channel.is_joined and not self._stopped.is_set():
+                await asyncio.sleep(REALTIME_CHECK_SECONDS)
+                if not self._token_usable():
+                    break
+                if self._access_token != token:
+                    token = self._access_token
+                    await client.set_auth(token)
+        finally:
+            self.realtime_connected = False
+            await client.close()
+
+
+_admin_index = None
+_admin_index_lock = threading.Lock()
+
+
+def get_admin_index(supabase: Client) -> AdminIndex:
+    """
+    Returns the process-wide admin index, building it on first use (or after
+    the previous one failed). supabase is the calling admin's session client;
+    the index reads with its current access token from now on.
+    The index holds every user's row and serves them without row level
+    security, so each call first checks that the caller is an admin right now
+    (one small query) and raises PermissionError if not. The first call also
+    reads every user; later calls cost only that check.
+    """
+    global _admin_index
+    if not db.is_admin(supabase):
+        raise PermissionError("admin role required")
+    session = supabase.auth.get_session()
+    access_token = session.access_token if session else None
+    with _admin_index_lock:
+        if _admin_index is None or _admin_index.failed:
+            _admin_index = AdminIndex(access_token)
+        else:
+            _admin_index.use_token(access_token)
+        return _admin_index
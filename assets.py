@@ -0,0 +1,80 @@
+# assets.py
+
+import hashlib
+import io
+import os
+
+import streamlit as st
+
+# Files served by Streamlit at app/static/ (server.enableStaticServing in
+# .streamlit/config.toml). Everything in it is generated by this module.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+
+LOGO_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "VATIFY.png")
+
+# Logos are stored at twice their display width (for high-DPI screens), never upscaled.
+LOGO_PIXEL_DENSITY = 2
+
+
+def publish(name: str, data: bytes) -> str:
+    """
+    Write data to STATIC_DIR under a content-hashed copy of name (e.g.
+    "logo.png" -> "logo-3f2a9c1e0b7d.png") and return its URL.
+    A changed asset gets a new URL, so browsers never show a stale copy, while
+    an unchanged one keeps its URL and can be served from the browser cache.
+    """
+    stem, extension = os.path.splitext(name)
+    filename = f"{stem}-{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+    path = os.path.join(STATIC_DIR, filename)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        partial = f"{path}.{os.getpid()}"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+    return f"{STATIC_URL}/{filename}"
+
+
+def static_serving() -> bool:
+    return bool(st.get_option("server.enableStaticServing"))
+
+
+@st.cache_resource
+def _logo(width: int) -> bytes:
+    """
+    The logo as PNG bytes, resized to width px (0 or anything larger than the
+    original keeps its size). Built once per process for each width.
+    Pillow is imported here, not with the module, as app.py and the auth views
+    import this module on every run, logged in or not.
+    """
+    from PIL import Image
+
+    with Image.open(LOGO_FILE) as image:
+        if 0 < width < image.width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, "PNG", optimize=True)
+    return output.getvalue()
+
+
+@st.cache_resource
+def _logo_url(width: int) -> str:
+    return publish(f"vatify-logo-{width}.png" if width else "vatify-logo.png", _logo(width))
+
+
+def render_logo(container=st, width: int = None):
+    """
+    Show the VATIFY logo in container at width px, or across the container's
+    full width if width is None.
+    With static serving the browser loads a pre-sized copy from app/static/ and
+    keeps it cached; otherwise the pre-sized bytes go through st.image.
+    """
+    pixels = width * LOGO_PIXEL_DENSITY if width else 0
+    if static_serving():
+        style = f"width:{width}px" if width else "width:100%"
+        container.markdown(f'<img src="{_logo_url(pixels)}" alt="VATIFY" style="{style}">', unsafe_allow_html=True)
+    elif width:
+        container.image(_logo(pixels), width=width)
+    else:
+        container.image(_logo(pixels), use_container_width=True)
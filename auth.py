@@ -1,13 +1,58 @@
 # auth.py
 
+import math
+import os
+import uuid
+
 import streamlit as st
 from supabase import create_client, Client, AuthApiError
 
+import assets
+import metrics
+import throttle
+
+# Reverse proxies in front of the app that append the client's address to
+# X-Forwarded-For. With none, the client is the address of the connection.
+TRUSTED_PROXY_HOPS = int(os.environ.get("VATIFY_TRUSTED_PROXY_HOPS", "0"))
+
+def _session_id() -> str:
+    """
+    Random id of this browser session, used for per-session rate limits.
+    """
+    return st.session_state.setdefault("_throttle_session_id", uuid.uuid4().hex)
+
+def _client_address() -> str:
+    """
+    The client's IP address for per-client rate limits: the X-Forwarded-For
+    entry added by the outermost of TRUSTED_PROXY_HOPS proxies (entries further
+    left are client-supplied), else the connection's address. Falls back to the
+    session id where Streamlit does not expose the address.
+    """
+    forwarded = [part.strip() for part in (st.context.headers.get("X-Forwarded-For") or "").split(",")]
+    forwarded = [part for part in forwarded if part]
+    if TRUSTED_PROXY_HOPS and len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return forwarded[-TRUSTED_PROXY_HOPS]
+    return getattr(st.context, "ip_address", None) or _session_id()
+
+def _allowed(action: str, email: str) -> bool:
+    """
+    Take a token for an auth call from the process-wide throttle (see
+    throttle.py). Returns False after showing a warning if the action is rate
+    limited for this email, session or client.
+    """
+    try:
+        throttle.get_auth_throttle().acquire(action, email, _session_id(), _client_address())
+    except throttle.RateLimited as e:
+        st.warning(f"Too many attempts. Please wait {math.ceil(e.retry_after)} seconds and try again.")
+        return False
+    return True
+
+@metrics.instrument_page("login")
 def render_login_view(supabase: Client):
     """
     Displays the login form and handles login logic.
     """
-    st.image("VATIFY.png", width=150)  # Smaller logo
+    assets.render_logo(width=150)  # Smaller logo
     st.title("VATIFY: Login")
 
     email = st.text_input("Email")
@@ -18,12 +63,17 @@ def render_login_view(supabase: Client):
             st.error("Please enter both email and password.")
             return
 
+        if not _allowed("login", email):
+            return
+
         try:
             user = supabase.auth.sign_in_with_password({"email": email, "password": password})
             if user and user.user:
                 st.session_state["logged_in"] = True
                 st.session_state["user_id"] = user.user.id
                 st.session_state["user_email"] = user.user.email
+                # The role is resolved from the session's token on the next run
+                st.session_state.pop("role_checked_at", None)
                 st.success(f"Welcome back, {user.user.email}!")
                 st.rerun()
             else:
@@ -40,13 +90,14 @@ def render_login_view(supabase: Client):
         st.rerun()
 
 
+@metrics.instrument_page("signup")
 def render_signup_view(supabase: Client):
     """
     Displays the sign-up form and handles user registration logic.
     Inserts a default role ("user") from the front end.
     (Ensure that any trigger on auth.users for inserting into user_roles is disabled or removed.)
     """
-    st.image("VATIFY.png", width=150)  # Smaller logo
+    assets.render_logo(width=150)  # Smaller logo
     st.title("VATIFY: Sign Up")
 
     email = st.text_input("Email")
@@ -61,6 +112,9 @@ def render_signup_view(supabase: Client):
             st.error("Passwords do not match.")
             return
 
+        if not _allowed("signup", email):
+            return
+
         try:
             # Attempt to sign up using Supabase Auth.
             result = supabase.auth.sign_up({"email": email, "password": password})
@@ -69,6 +123,7 @@ def render_signup_view(supabase: Client):
                 st.error("Sign up failed. Please try again.")
             else:
                 # Insert the default role into user_roles table from the front end.
+                # (submit_onboarding also creates it if this fails; see sql/013.)
                 default_role = {"user_id": result.user.id, "role": "user"}
                 supabase.table("user_roles").insert(default_role).execute()
 
@@ -84,11 +139,12 @@ def render_signup_view(supabase: Client):
 
 
 
+@metrics.instrument_page("forgot_password")
 def render_forgot_password_view(supabase: Client):
     """
     Displays the forgot password form and sends a password reset link.
     """
-    st.image("VATIFY.png", width=150)  # Smaller logo
+    assets.render_logo(width=150)  # Smaller logo
     st.title("VATIFY: Forgot Password")
 
     email = st.text_input("Enter your email address")
@@ -98,6 +154,9 @@ def render_forgot_password_view(supabase: Client):
             st.error("Please enter an email address.")
             return
 
+        if not _allowed("reset_password", email):
+            return
+
         try:
             supabase.auth.reset_password_for_email(email)
             st.success(f"Password reset link sent to {email}.")
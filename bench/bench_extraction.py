@@ -0,0 +1,112 @@
+# bench_extraction.py
+"""
+Throughput of the document text extraction behind the onboarding pre-fill
+suggestions (extraction.py): reads the same set of PDFs with 1, 2, ... N
+worker processes and reports pages per second, overall and per worker.
+
+    python bench/bench_extraction.py --workers 4 --documents 40
+    python bench/bench_extraction.py --files cipc.pdf id.pdf --workers 2
+
+Without --files, text PDFs of --pages pages each are generated; those only
+measure the text layer. Pass real scanned documents to measure OCR.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import extraction
+
+# Text of each generated page; the first page carries the pre-fill fields.
+SAMPLE_FIRST_PAGE = [
+    "COMPANIES AND INTELLECTUAL PROPERTY COMMISSION",
+    "Enterprise Name: Bench Trading (Pty) Ltd",
+    "Income Tax Reference Number: 9012345678",
+    "Director ID number 8001015009087",
+]
+SAMPLE_PAGE = ["Lorem ipsum dolor sit amet, consectetur adipiscing elit."] * 40
+
+
+def sample_pdf(pages: int) -> bytes:
+    """
+    A minimal PDF with one Helvetica text page per page.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for index in range(pages):
+        lines = SAMPLE_FIRST_PAGE if index == 0 else SAMPLE_PAGE
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 780 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def run(documents: list, workers: int) -> tuple:
+    """
+    Extract every document with `workers` processes. Returns (pages, seconds),
+    not counting the time to start the workers.
+    """
+    with ProcessPoolExecutor(workers) as pool:
+        # Start every worker (and its imports) before timing
+        list(pool.map(extraction.extract_fields, [sample_pdf(1)] * workers))
+        started = time.perf_counter()
+        outcomes = list(pool.map(extraction.extract_fields, documents))
+        seconds = time.perf_counter() - started
+    return sum(outcome["pages"] for outcome in outcomes), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="highest worker count to measure")
+    parser.add_argument("--documents", type=int, default=40, help="generated documents per run")
+    parser.add_argument("--pages", type=int, default=extraction.EXTRACTION_MAX_PAGES, help="pages per generated PDF")
+    parser.add_argument("--files", nargs="+", help="read these documents instead (each read --documents times in total)")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if extraction.pypdfium2 is None:
+        sys.exit("pypdfium2 is not installed; PDFs would yield no text (pip install pypdfium2)")
+
+    if args.files:
+        sources = [Path(name).read_bytes() for name in args.files]
+        documents = [sources[i % len(sources)] for i in range(args.documents)]
+    else:
+        documents = [sample_pdf(args.pages)] * args.documents
+    print(f"fields found in the first document: {extraction.extract_fields(documents[0])['fields']}")
+
+    lines = [f"{'workers':>7} {'pages':>6} {'seconds':>8} {'pages/s':>9} {'pages/s/worker':>15}"]
+    for workers in range(1, args.workers + 1):
+        pages, seconds = run(documents, workers)
+        lines.append(
+            f"{workers:>7} {pages:>6} {seconds:>8.2f} {pages / seconds:>9.1f} {pages / seconds / workers:>15.1f}"
+        )
+    text = "\n".join(lines)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,687 @@
+# fake_supabase.py
+"""
+In-memory stand-in for the parts of Supabase the app uses: PostgREST tables,
+views and RPCs, Storage objects (including resumable uploads) and password
+sign-in. Every request can be delayed by an injected latency so benchmarks
+see realistic round-trip costs.
+
+Run it on its own with:
+
+    python bench/fake_supabase.py --port 54321 --latency-ms 40
+
+and point the app at it with VATIFY_SUPABASE_URL=http://127.0.0.1:54321.
+"""
+
+import argparse
+import base64
+import fnmatch
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+# Query-string keys that are not column filters.
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns", "or"}
+
+# Columns identifying a row for upserts, per table.
+PRIMARY_KEYS = {
+    "user_onboarding": ["user_id"],
+    "user_documents": ["user_id", "doc_type"],
+    "user_roles": ["user_id"],
+    "onboarding_drafts": ["user_id"],
+}
+
+# Document types pivoted into the document_uploads view (column "<doc_type>_url").
+DOCUMENT_TYPES = [
+    "cipc_document", "id_document", "tax_clearance", "power_of_attorney", "proof_of_address", "other_documents",
+]
+
+# Document types counted by dashboard_summary.documents_uploaded.
+DOCUMENT_COUNT_TYPES = ["cipc_document", "id_document", "tax_clearance", "power_of_attorney"]
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def make_token(claims: dict) -> str:
+    """
+    Unsigned JWT-shaped token; the app only ever decodes the payload.
+    """
+    return f"{_b64({'alg': 'HS256', 'typ': 'JWT'})}.{_b64(claims)}.fake-signature"
+
+
+# Anon key accepted by create_client (it only checks the token shape).
+ANON_KEY = make_token({"iss": "supabase", "role": "anon"})
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _text(value) -> str:
+    """
+    A cell as PostgREST compares it in filters.
+    """
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _unquote_value(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return value
+
+
+def _compare(cell, value: str):
+    """
+    Orders a cell against a filter value, numerically when both are numbers.
+    """
+    try:
+        return float(cell) - float(value)
+    except (TypeError, ValueError):
+        left, right = _text(cell), value
+        return (left > right) - (left < right)
+
+
+def _match(row: dict, column: str, expression: str) -> bool:
+    """
+    Evaluates one PostgREST filter such as "eq.abc", "not.is.null" or "ilike.*x*".
+    """
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, value = expression.partition(".")
+    value = _unquote_value(value)
+    cell = row.get(column)
+
+    if operator == "eq":
+        result = _text(cell) == value
+    elif operator == "neq":
+        result = _text(cell) != value
+    elif operator == "gt":
+        result = cell is not None and _compare(cell, value) > 0
+    elif operator == "gte":
+        result = cell is not None and _compare(cell, value) >= 0
+    elif operator == "lt":
+        result = cell is not None and _compare(cell, value) < 0
+    elif operator == "lte":
+        result = cell is not None and _compare(cell, value) <= 0
+    elif operator == "is":
+        result = _text(cell) == value
+    elif operator == "in":
+        result = _text(cell) in [_unquote_value(v) for v in value.strip("()").split(",")]
+    elif operator in ("like", "ilike"):
+        pattern = value.replace("%", "*")
+        subject = _text(cell) if cell is not None else ""
+        if operator == "ilike":
+            pattern, subject = pattern.lower(), subject.lower()
+        result = fnmatch.fnmatchcase(subject, pattern)
+    else:
+        raise ValueError(f"unsupported operator: {operator}")
+    return result != negate
+
+
+def _split_top_level(text: str) -> list:
+    """
+    Splits "a.eq.1,b.ilike.\"x,y\"" on commas outside quotes and parentheses.
+    """
+    parts, depth, quoted, current = [], 0, False, ""
+    previous = ""
+    for char in text:
+        if char == '"' and previous != "\\":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+        previous = char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _match_logic(row: dict, operator: str, body: str) -> bool:
+    """
+    Evaluates an or=(...) / and(...) group.
+    """
+    results = []
+    for item in _split_top_level(body):
+        if item.startswith(("or(", "and(")):
+            inner_operator, _, inner = item.partition("(")
+            results.append(_match_logic(row, inner_operator, inner[:-1]))
+        else:
+            column, _, expression = item.partition(".")
+            results.append(_match(row, column, expression))
+    return any(results) if operator == "or" else all(results)
+
+
+def _admin_bulk_update(fake, payload: dict, claims: dict) -> list:
+    """
+    Stand-in for sql/004_admin_bulk_operations.sql (auth.users is approximated
+    by the users known to any table).
+    """
+    caller = claims.get("sub")
+    if not any(r["user_id"] == caller and r["role"] == "admin" for r in fake.tables["user_roles"]):
+        raise PermissionError("admin role required")
+    action, user_ids = payload["action"], payload["user_ids"]
+    onboarding, documents = fake.tables["user_onboarding"], fake.tables["user_documents"]
+    changed = set()
+    if action == "mark_reviewed":
+        for row in onboarding:
+            if row["user_id"] in user_ids:
+                row.update(reviewed_at=_now(), reviewed_by=caller, updated_at=_now())
+                changed.add(row["user_id"])
+    elif action == "set_role":
+        known = {row["user_id"] for table in fake.tables.values() for row in table if "user_id" in row}
+        roles = {row["user_id"]: row for row in fake.tables["user_roles"]}
+        for user_id in set(user_ids) & known:
+            if user_id not in roles:
+                roles[user_id] = {"user_id": user_id}
+                fake.tables["user_roles"].append(roles[user_id])
+            roles[user_id].update(role=payload["new_role"], updated_at=_now())
+            changed.add(user_id)
+    elif action == "reset_onboarding":
+        changed = {row["user_id"] for row in onboarding + documents if row["user_id"] in user_ids}
+        fake.tables["user_onboarding"] = [row for row in onboarding if row["user_id"] not in user_ids]
+        fake.tables["user_documents"] = [row for row in documents if row["user_id"] not in user_ids]
+    else:
+        raise ValueError(f"unknown action: {action}")
+    return [
+        {"user_id": user_id, "outcome": "updated" if user_id in changed else "not_found", "detail": None}
+        for user_id in user_ids
+    ]
+
+
+def _is_admin(fake, payload: dict, claims: dict) -> bool:
+    """
+    Stand-in for is_admin() of sql/010_dashboard_summary_keyset.sql.
+    """
+    return any(r["user_id"] == claims.get("sub") and r["role"] == "admin" for r in fake.tables["user_roles"])
+
+
+def _submit_onboarding(fake, payload: dict, claims: dict):
+    """
+    Stand-in for submit_onboarding as redefined in sql/013_user_role_on_submit.sql.
+    """
+    user_id = claims.get("sub")
+    if not user_id:
+        raise PermissionError("not signed in")
+    if not any(r["user_id"] == user_id for r in fake.tables["user_roles"]):
+        fake.tables["user_roles"].append({"user_id": user_id, "role": "user", "updated_at": _now()})
+    details = payload.get("details")
+    if details is not None:
+        details = {key: value for key, value in details.items() if key != "user_id"}
+        row = next((r for r in fake.tables["user_onboarding"] if r["user_id"] == user_id), None)
+        if row is None:
+            row = {"user_id": user_id}
+            fake.tables["user_onboarding"].append(row)
+        row.update(details, updated_at=_now())
+        # Writing the details ends the draft
+        fake.tables["onboarding_drafts"] = [r for r in fake.tables["onboarding_drafts"] if r["user_id"] != user_id]
+    stored = {row["doc_type"]: row for row in fake.tables["user_documents"] if row["user_id"] == user_id}
+    for doc_type, document in (payload.get("documents") or {}).items():
+        size = document.get("size")
+        if size is None:
+            size = next((r["size"] for r in stored.values() if r["hash"] == document.get("hash") and r["size"]), None)
+        row = stored.get(doc_type)
+        if row is None:
+            row = {"user_id": user_id, "doc_type": doc_type}
+            fake.tables["user_documents"].append(row)
+        elif (row["url"], row["hash"]) == (document["url"], document.get("hash")):
+            continue
+        row.update(url=document["url"], hash=document.get("hash"), size=size, uploaded_at=_now())
+    return None
+
+
+def _save_onboarding_draft(fake, payload: dict, claims: dict):
+    """
+    Stand-in for sql/008_onboarding_drafts.sql.
+    """
+    user_id = claims.get("sub")
+    if not user_id:
+        raise PermissionError("not signed in")
+    row = next((r for r in fake.tables["onboarding_drafts"] if r["user_id"] == user_id), None)
+    if row is None:
+        row = {"user_id": user_id, "fields": {}}
+        fake.tables["onboarding_drafts"].append(row)
+    row.update(fields={**row["fields"], **payload["changes"]}, updated_at=_now())
+    return None
+
+
+class FakeSupabase:
+    """
+    The in-memory database and object store behind the fake server.
+    Tables are lists of dicts; views and RPCs are Python callables registered
+    in `views` and `rpcs`. All access goes through one lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {name: [] for name in PRIMARY_KEYS}
+        self.objects = {}
+        self.object_created_at = {}
+        self.uploads = {}
+        self.views = {"dashboard_summary": self._dashboard_summary, "document_uploads": self._document_uploads}
+        self.rpcs = {
+            "admin_bulk_update": _admin_bulk_update,
+            "is_admin": _is_admin,
+            "submit_onboarding": _submit_onboarding,
+            "save_onboarding_draft": _save_onboarding_draft,
+        }
+        self.requests = Counter()
+
+    # ----------------- data helpers -----------------
+
+    def seed(self, table: str, rows: list):
+        with self.lock:
+            self.tables.setdefault(table, []).extend(dict(row) for row in rows)
+
+    def _rows(self, name: str) -> list:
+        if name in self.views:
+            return self.views[name]()
+        return self.tables.setdefault(name, [])
+
+    def _document_uploads(self) -> list:
+        rows = {}
+        for document in self.tables["user_documents"]:
+            row = rows.setdefault(document["user_id"], {
+                "user_id": document["user_id"],
+                **{f"{doc_type}_url": "" for doc_type in DOCUMENT_TYPES},
+                "document_hashes": {},
+            })
+            row[f"{document['doc_type']}_url"] = document["url"]
+            if document.get("hash"):
+                row["document_hashes"][f"{document['doc_type']}_url"] = document["hash"]
+        return [rows[user_id] for user_id in sorted(rows)]
+
+    def _dashboard_summary(self) -> list:
+        onboarding = {row["user_id"]: row for row in self.tables["user_onboarding"]}
+        counts = Counter(
+            row["user_id"] for row in self.tables["user_documents"] if row["doc_type"] in DOCUMENT_COUNT_TYPES
+        )
+        roles = {row["user_id"]: row for row in self.tables["user_roles"]}
+        # Latest change of each user's details, documents or role (sql/007_admin_change_feed.sql)
+        changed = {}
+        sources = (("user_onboarding", "updated_at"), ("user_documents", "uploaded_at"), ("user_roles", "updated_at"))
+        for table, column in sources:
+            for row in self.tables[table]:
+                if row.get(column):
+                    changed[row["user_id"]] = max(changed.get(row["user_id"], ""), row[column])
+        rows = []
+        # One row per user_roles row (sql/010_dashboard_summary_keyset.sql)
+        for user_id in sorted(roles):
+            o = onboarding.get(user_id, {})
+            rows.append({
+                "user_id": user_id,
+                "contact_name": o.get("contact_name"),
+                "email_address": o.get("email_address"),
+                "company_name": o.get("company_name"),
+                "onboarding_complete": bool(o),
+                "documents_uploaded": counts[user_id],
+                "profile_complete": all(o.get(key) for key in ["contact_name", "company_name", "email_address"]),
+                "reviewed_at": o.get("reviewed_at"),
+                "role": roles[user_id].get("role") or "user",
+                "updated_at": changed.get(user_id),
+            })
+        return rows
+
+    @staticmethod
+    def _filter(rows: list, params: list) -> list:
+        for key, value in params:
+            if key == "or":
+                rows = [row for row in rows if _match_logic(row, "or", value[1:-1])]
+            elif key not in RESERVED_PARAMS:
+                rows = [row for row in rows if _match(row, key, value)]
+        return rows
+
+    @staticmethod
+    def _project(rows: list, select: str) -> list:
+        if not select or select == "*":
+            return [dict(row) for row in rows]
+        # "column", "json_column->>key" or "alias:..." (PostgREST renaming)
+        projection = []
+        for item in select.split(","):
+            alias, _, source = item.strip().rpartition(":")
+            column, _, key = source.partition("->>")
+            projection.append((alias or source, column, key))
+        return [
+            {
+                name: ((row.get(column) or {}).get(key) if key else row.get(column))
+                for name, column, key in projection
+            }
+            for row in rows
+        ]
+
+    # ----------------- PostgREST -----------------
+
+    def select(self, table: str, params: list) -> list:
+        options = dict(params)
+        with self.lock:
+            rows = self._filter(self._rows(table), params)
+        if "order" in options:
+            column, _, direction = options["order"].partition(".")
+            rows = sorted(rows, key=lambda row: _text(row.get(column)), reverse=direction.startswith("desc"))
+        offset = int(options.get("offset", 0))
+        if "limit" in options:
+            rows = rows[offset:offset + int(options["limit"])]
+        elif offset:
+            rows = rows[offset:]
+        return self._project(rows, options.get("select", "*"))
+
+    def insert(self, table: str, payload, params: list, upsert: bool) -> list:
+        rows = payload if isinstance(payload, list) else [payload]
+        options = dict(params)
+        keys = options.get("on_conflict", "").split(",") if options.get("on_conflict") else PRIMARY_KEYS.get(table, [])
+        written = []
+        with self.lock:
+            existing = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                row.setdefault("updated_at", _now())
+                match = None
+                if upsert and keys:
+                    match = next((r for r in existing if all(r.get(k) == row.get(k) for k in keys)), None)
+                if match is not None:
+                    match.update(row)
+                    written.append(dict(match))
+                else:
+                    existing.append(row)
+                    written.append(dict(row))
+        return written
+
+    def update(self, table: str, payload: dict, params: list) -> list:
+        with self.lock:
+            rows = self._filter(self.tables.setdefault(table, []), params)
+            for row in rows:
+                row.update(payload)
+                row["updated_at"] = _now()
+            return [dict(row) for row in rows]
+
+    def delete(self, table: str, params: list) -> list:
+        with self.lock:
+            existing = self.tables.setdefault(table, [])
+            removed = self._filter(existing, params)
+            self.tables[table] = [row for row in existing if row not in removed]
+            return removed
+
+    def rpc(self, name: str, payload: dict, token_claims: dict):
+        handler = self.rpcs.get(name)
+        if handler is None:
+            raise KeyError(name)
+        with self.lock:
+            return handler(self, payload or {}, token_claims)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeSupabase = None
+    latency: float = 0.0
+    jitter: float = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    # ----------------- plumbing -----------------
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("content-length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body=None, headers: dict = None, raw: bytes = None, content_type="application/json"):
+        data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _claims(self) -> dict:
+        token = self.headers.get("authorization", "").removeprefix("Bearer ")
+        try:
+            payload = token.split(".")[1]
+            return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            return {}
+
+    def _dispatch(self):
+        self._delay()
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        params = parse_qsl(url.query, keep_blank_values=True)
+        self.fake.requests[f"{self.command} {'/'.join(parts[:3])}"] += 1
+        try:
+            if parts[:2] == ["rest", "v1"]:
+                self._rest(parts[2:], params)
+            elif parts[:2] == ["storage", "v1"]:
+                self._storage(parts[2:], params)
+            elif parts[:2] == ["auth", "v1"]:
+                self._auth(parts[2:], params)
+            else:
+                self._send(404, {"message": "not found"})
+        except KeyError as e:
+            self._send(404, {"message": f"not found: {e}"})
+        except PermissionError as e:
+            self._send(403, {"message": str(e)})
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send(400, {"message": str(e)})
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = do_HEAD = _dispatch
+
+    # ----------------- services -----------------
+
+    def _rest(self, parts: list, params: list):
+        prefer = self.headers.get("prefer", "")
+        if parts[0] == "rpc":
+            body = self._body()
+            result = self.fake.rpc(parts[1], json.loads(body) if body else {}, self._claims())
+            self._send(200, result)
+            return
+        table = parts[0]
+        if self.command == "GET":
+            self._send(200, self.fake.select(table, params))
+        elif self.command == "POST":
+            rows = self.fake.insert(table, json.loads(self._body()), params, "merge-duplicates" in prefer)
+            self._send(201, rows)
+        elif self.command == "PATCH":
+            self._send(200, self.fake.update(table, json.loads(self._body()), params))
+        elif self.command == "DELETE":
+            self._send(200, self.fake.delete(table, params))
+        else:
+            self._send(405, {"message": "method not allowed"})
+
+    def _storage(self, parts: list, params: list):
+        fake = self.fake
+        if parts[:2] == ["upload", "resumable"]:
+            self._resumable(parts[2:])
+        elif parts[0] == "object" and self.command in ("POST", "PUT") and parts[1] not in ("sign", "public", "list"):
+            key = "/".join(parts[1:])
+            with fake.lock:
+                fake.objects[key] = (self._body(), self.headers.get("content-type", "application/octet-stream"))
+                fake.object_created_at[key] = _now()
+            self._send(200, {"Key": key, "Id": str(uuid.uuid4())})
+        elif parts[:2] == ["object", "list"] and self.command == "POST":
+            # Direct children of prefix: folders (id null) and objects
+            body = json.loads(self._body() or b"{}")
+            prefix = "/".join([parts[2], *filter(None, body.get("prefix", "").split("/"))]) + "/"
+            entries = {}
+            with fake.lock:
+                for key, (data, content_type) in fake.objects.items():
+                    if not key.startswith(prefix):
+                        continue
+                    name, _, rest = key[len(prefix):].partition("/")
+                    if rest:
+                        entries.setdefault(name, {"name": name, "id": None})
+                    else:
+                        entries[name] = {
+                            "name": name,
+                            "id": key,
+                            "created_at": fake.object_created_at.get(key),
+                            "metadata": {"size": len(data), "mimetype": content_type},
+                        }
+            self._send(200, sorted(entries.values(), key=lambda entry: entry["name"])[:body.get("limit", 100)])
+        elif parts[:2] == ["object", "sign"] and self.command == "POST":
+            # object/sign/<bucket>/<path> signs one object, object/sign/<bucket> a list of paths
+            body = json.loads(self._body() or b"{}")
+            bucket = parts[2]
+            if len(parts) > 3:
+                self._send(200, {"signedURL": f"/object/sign/{bucket}/{'/'.join(parts[3:])}?token=fake"})
+            else:
+                self._send(200, [
+                    {"path": path, "signedURL": f"/object/sign/{bucket}/{path}?token=fake", "error": None}
+                    for path in body.get("paths", [])
+                ])
+        elif parts[0] == "object" and self.command == "GET":
+            # object/public/<bucket>/<path>, object/authenticated/<bucket>/<path> or object/<bucket>/<path>
+            key_parts = parts[2:] if parts[1] in ("public", "authenticated", "sign") else parts[1:]
+            data, content_type = fake.objects["/".join(key_parts)]
+            self._send(200, raw=data, content_type=content_type)
+        elif parts[0] == "object" and self.command == "DELETE":
+            body = json.loads(self._body() or b"{}")
+            bucket = parts[1]
+            with fake.lock:
+                for prefix in body.get("prefixes", []):
+                    fake.objects.pop(f"{bucket}/{prefix}", None)
+                    fake.object_created_at.pop(f"{bucket}/{prefix}", None)
+            self._send(200, [])
+        else:
+            self._send(404, {"message": "not found"})
+
+    def _resumable(self, parts: list):
+        fake = self.fake
+        if self.command == "POST":
+            metadata = {}
+            for item in self.headers.get("upload-metadata", "").split(","):
+                key, _, value = item.strip().partition(" ")
+                metadata[key] = base64.b64decode(value).decode() if value else ""
+            upload_id = str(uuid.uuid4())
+            with fake.lock:
+                fake.uploads[upload_id] = {
+                    "key": f"{metadata.get('bucketName')}/{metadata.get('objectName')}",
+                    "content_type": metadata.get("contentType", "application/octet-stream"),
+                    "length": int(self.headers["upload-length"]),
+                    "data": bytearray(),
+                }
+            self._send(201, headers={"Location": f"/storage/v1/upload/resumable/{upload_id}", "Tus-Resumable": "1.0.0"})
+            return
+        upload = fake.uploads[parts[0]]
+        if self.command == "PATCH":
+            chunk = self._body()
+            with fake.lock:
+                if int(self.headers["upload-offset"]) != len(upload["data"]):
+                    self._send(409, {"message": "offset mismatch"})
+                    return
+                upload["data"].extend(chunk)
+                if len(upload["data"]) >= upload["length"]:
+                    fake.objects[upload["key"]] = (bytes(upload["data"]), upload["content_type"])
+                    fake.object_created_at[upload["key"]] = _now()
+        self._send(204 if self.command == "PATCH" else 200, headers={
+            "Upload-Offset": str(len(upload["data"])),
+            "Upload-Length": str(upload["length"]),
+            "Tus-Resumable": "1.0.0",
+        })
+
+    def _auth(self, parts: list, params: list):
+        if parts[0] == "token":
+            body = json.loads(self._body() or b"{}")
+            email = body.get("email", "user@example.com")
+            user_id = str(uuid.uuid5(uuid.NAMESPACE_URL, email))
+            with self.fake.lock:
+                role = next((r["role"] for r in self.fake.tables["user_roles"] if r["user_id"] == user_id), "user")
+            now = _now()
+            user = {
+                "id": user_id,
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": email,
+                "app_metadata": {"provider": "email"},
+                "user_metadata": {},
+                "created_at": now,
+                "updated_at": now,
+            }
+            token = make_token({"sub": user_id, "email": email, "role": "authenticated",
+                                "user_role": role, "exp": int(time.time()) + 3600})
+            self._send(200, {
+                "access_token": token,
+                "token_type": "bearer",
+                "expires_in": 3600,
+                "expires_at": int(time.time()) + 3600,
+                "refresh_token": str(uuid.uuid4()),
+                "user": user,
+            })
+        elif parts[0] == "user" and self.command == "GET":
+            claims = self._claims()
+            if not claims.get("sub"):
+                self._send(401, {"message": "invalid token"})
+                return
+            now = _now()
+            self._send(200, {
+                "id": claims["sub"],
+                "aud": "authenticated",
+                "role": "authenticated",
+                "email": claims.get("email"),
+                "app_metadata": {"provider": "email"},
+                "user_metadata": {},
+                "created_at": now,
+                "updated_at": now,
+            })
+        elif parts[0] in ("logout", "recover"):
+            self._send(204 if parts[0] == "logout" else 200, {} if parts[0] == "recover" else None)
+        else:
+            self._send(404, {"message": "not found"})
+
+
+def start_server(fake: FakeSupabase, port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+    """
+    Serve `fake` on 127.0.0.1 from a daemon thread with the given injected
+    latency. Returns (server, base_url); port 0 picks a free port.
+    """
+    handler = type("Handler", (_Handler,), {
+        "fake": fake,
+        "latency": latency_ms / 1000,
+        "jitter": jitter_ms / 1000,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-supabase", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_server(FakeSupabase(), args.port, args.latency_ms, args.jitter_ms)
+    print(f"Fake Supabase listening on {url}")
+    print(f"VATIFY_SUPABASE_URL={url}")
+    print(f"VATIFY_SUPABASE_KEY={ANON_KEY}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
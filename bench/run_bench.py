@@ -0,0 +1,194 @@
+# run_bench.py
+"""
+Load-test harness: simulates N logged-in users driving the app with Streamlit's
+AppTest against the in-memory Supabase stand-in (fake_supabase.py) and reports
+rerun latency percentiles, Supabase round-trips per rerun and peak memory.
+
+    python bench/run_bench.py --users 10 --reruns 5 --latency-ms 40
+    python bench/run_bench.py --users 25 --seed-users 5000 --output bench_output.txt
+
+The first simulated user is an admin, so the admin dashboard is measured too.
+AppTest is not thread-safe (it installs a process-wide Streamlit runtime), so
+each simulated user runs in its own process; process-wide caches of the app
+(e.g. the admin index) are therefore per user here, not shared as on a server.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fake_supabase
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Pages visited by every simulated user, in order ("Admin" only by admins).
+PAGES = ["Home", "Onboard", "Profile", "Admin"]
+
+
+def seed_users(fake: fake_supabase.FakeSupabase, url: str, count: int) -> list:
+    """
+    Adds `count` fully onboarded users and returns their (user_id, email) pairs.
+    """
+    public = f"{url}/storage/v1/object/public/documents"
+    users, onboarding, docs, roles = [], [], [], []
+    for i in range(count):
+        email = f"user{i}@example.com"
+        user_id = str(uuid.uuid5(uuid.NAMESPACE_URL, email))
+        users.append((user_id, email))
+        onboarding.append({
+            "user_id": user_id,
+            "contact_name": f"User {i}",
+            "contact_details": "",
+            "company_name": f"Company {i} (Pty) Ltd",
+            "address": f"{i} Main Road, Cape Town",
+            "id_number": f"{8001015009087 + i}",
+            "citizenship": "South African",
+            "company_tax_number": f"{9000000000 + i}",
+            "email_address": email,
+            "mobile": "0820000000",
+            "efiling_login_details": {"username": f"user{i}", "password": "secret"},
+            "e_sign": True,
+        })
+        for doc_type in ["cipc_document", "id_document"]:
+            docs.append({
+                "user_id": user_id,
+                "doc_type": doc_type,
+                "url": f"{public}/{user_id}/{doc_type}",
+                "hash": None,
+                "size": None,
+                "uploaded_at": fake_supabase._now(),
+            })
+        roles.append({"user_id": user_id, "role": "admin" if i == 0 else "user"})
+    fake.seed("user_onboarding", onboarding)
+    fake.seed("user_documents", docs)
+    fake.seed("user_roles", roles)
+    return users
+
+
+def simulate_user(user_id: str, email: str, is_admin: bool, reruns: int, timeout: float) -> dict:
+    """
+    Logs one user in (signing in the session's Supabase client, as the login
+    view does), visits each page and reruns it `reruns` times. Runs in a
+    worker process of its own.
+    Returns ({page: [(seconds, round_trips), ...]}, peak traced bytes).
+    """
+    tracemalloc.start()
+    from streamlit.testing.v1 import AppTest
+
+    import db
+
+    supabase = db.new_client()
+    supabase.auth.sign_in_with_password({"email": email, "password": "bench"})
+
+    samples = defaultdict(list)
+    app = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+    app.session_state["_supabase_client"] = supabase
+    app.session_state["logged_in"] = True
+    app.session_state["user_id"] = user_id
+    app.session_state["user_email"] = email
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"login: {app.exception[0].message}")
+
+    for page in PAGES:
+        if page == "Admin" and not is_admin:
+            continue
+        app.sidebar.radio[0].set_value(page)
+        for _ in range(reruns):
+            start = time.perf_counter()
+            app.run()
+            elapsed = time.perf_counter() - start
+            if app.exception:
+                raise RuntimeError(f"{page}: {app.exception[0].message}")
+            calls = app.session_state["_last_run_metrics"]
+            samples[page].append((elapsed, sum(1 for call in calls if call["kind"] == "http")))
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(samples), peak_bytes
+
+
+def _percentile(values: list, pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def report(samples: dict, users: int, peak_bytes: int, fake: fake_supabase.FakeSupabase) -> str:
+    lines = [
+        f"{'page':<10} {'reruns':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/rerun':>12}",
+    ]
+    for page in PAGES:
+        if not samples.get(page):
+            continue
+        seconds = [s for s, _ in samples[page]]
+        calls = [c for _, c in samples[page]]
+        lines.append(
+            f"{page:<10} {len(seconds):>6} "
+            f"{_percentile(seconds, 50) * 1000:>8.1f} "
+            f"{_percentile(seconds, 95) * 1000:>8.1f} "
+            f"{_percentile(seconds, 99) * 1000:>8.1f} "
+            f"{statistics.mean(calls):>12.2f}"
+        )
+    lines.append("")
+    lines.append(
+        f"peak traced memory: {peak_bytes / 2**20:.1f} MiB total, {peak_bytes / 2**20 / users:.2f} MiB per session "
+        f"(each in its own process, including its imports)"
+    )
+    lines.append(f"requests served by the stand-in: {sum(fake.requests.values())}")
+    for name, count in fake.requests.most_common():
+        lines.append(f"  {count:>6}  {name}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5, help="concurrent simulated users")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns per page per user")
+    parser.add_argument("--seed-users", type=int, default=0, help="extra onboarded users in the database")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="injected latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="random +/- latency per request")
+    parser.add_argument("--timeout", type=float, default=60.0, help="AppTest timeout per rerun (seconds)")
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    fake = fake_supabase.FakeSupabase()
+    server, url = fake_supabase.start_server(fake, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    users = seed_users(fake, url, max(args.users, args.seed_users))
+
+    # The app reads these when db.py is first imported (in the worker processes)
+    os.environ["VATIFY_SUPABASE_URL"] = url
+    os.environ["VATIFY_SUPABASE_KEY"] = fake_supabase.ANON_KEY
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    # Keep the report readable: Streamlit logs deprecation notices on every run
+    os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+
+    samples = defaultdict(list)
+    peak_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.users) as pool:
+        futures = [
+            pool.submit(simulate_user, user_id, email, i == 0, args.reruns, args.timeout)
+            for i, (user_id, email) in enumerate(users[:args.users])
+        ]
+        for future in futures:
+            user_samples, user_peak_bytes = future.result()
+            peak_bytes += user_peak_bytes
+            for page, page_samples in user_samples.items():
+                samples[page].extend(page_samples)
+    server.shutdown()
+
+    text = report(samples, args.users, peak_bytes, fake)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# documents.py
+
+import base64
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, unquote, urlsplit
+
+import httpx
+import streamlit as st
+from PIL import Image, ImageOps
+from supabase import Client
+
+try:
+    import pypdfium2
+except ImportError:  # optional: without it PDFs get no thumbnail
+    pypdfium2 = None
+
+import db
+
+# Storage bucket holding all onboarding documents.
+DOCUMENTS_BUCKET = "documents"
+
+# Private storage bucket holding admin export archives (sql/009_export_bucket.sql).
+EXPORTS_BUCKET = "exports"
+
+# Files at or above this size are streamed through the resumable (TUS) endpoint
+# instead of being read into memory and uploaded in one request.
+STREAMING_UPLOAD_THRESHOLD = 6 * 1024 * 1024
+
+# Supabase expects 6 MB chunks for resumable uploads (only the last may be smaller).
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+
+# How many times a failed chunk is resumed before the upload is abandoned.
+UPLOAD_MAX_RETRIES = 3
+
+UPLOAD_TIMEOUT_SECONDS = 60.0
+
+# Block size used when hashing file contents.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Block size used when streaming stored documents back out.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Lifetime of the signed URLs handed to the browser, and how long before expiry
+# a cached one is replaced.
+SIGNED_URL_TTL_SECONDS = 3600
+SIGNED_URL_REFRESH_SECONDS = 300
+
+# Document thumbnails are kept here (shared by all sessions of the process).
+THUMBNAIL_DIR = os.environ.get("VATIFY_THUMBNAIL_DIR", os.path.join(tempfile.gettempdir(), "vatify_thumbnails"))
+THUMBNAIL_SIZE = (320, 320)
+
+_SIGNED_URL_CACHE_KEY = "_signed_urls"
+
+
+def file_size(file_obj) -> int:
+    """
+    Returns the size of a file-like object in bytes without reading it.
+    Streamlit's UploadedFile exposes .size; anything else is measured by seeking.
+    """
+    size = getattr(file_obj, "size", None)
+    if size is None:
+        position = file_obj.tell()
+        file_obj.seek(0, 2)
+        size = file_obj.tell()
+        file_obj.seek(position)
+    return size
+
+
+def content_hash(file_obj) -> str:
+    """
+    Returns the SHA-256 hex digest of a file-like object's contents.
+    The file is read in HASH_CHUNK_SIZE blocks and rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def _auth_headers(supabase: Client) -> dict:
+    """
+    Headers authenticating a raw storage request as the client's current user,
+    or with the client's fixed token if it has no session (db.token_client,
+    or anonymous clients, whose token is the API key).
+    """
+    session = supabase.auth.get_session()
+    authorization = f"Bearer {session.access_token}" if session else supabase.options.headers["Authorization"]
+    return {"apikey": supabase.supabase_key, "authorization": authorization}
+
+
+def _encode_metadata(metadata: dict) -> str:
+    """
+    Encodes TUS Upload-Metadata: comma separated "key base64(value)" pairs.
+    """
+    return ",".join(
+        f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+    )
+
+
+def storage_path(url: str):
+    """
+    The object path inside DOCUMENTS_BUCKET of a stored document URL (as saved
+    in document_uploads), or None if the URL does not point into the bucket.
+    """
+    path = unquote(urlsplit(url).path)
+    for kind in ("public", "authenticated", "sign"):
+        marker = f"/storage/v1/object/{kind}/{DOCUMENTS_BUCKET}/"
+        if marker in path:
+            return path.split(marker, 1)[1]
+    return None
+
+
+def signed_urls(supabase: Client, urls: list) -> dict:
+    """
+    Short-lived signed URLs for stored documents, as {url: signed url}.
+    Signed URLs are cached in session state until SIGNED_URL_REFRESH_SECONDS
+    before they expire; all the others are signed together in one request.
+    URLs outside the documents bucket are returned unchanged.
+    """
+    cache = st.session_state.setdefault(_SIGNED_URL_CACHE_KEY, {})
+    now = time.monotonic()
+    paths = {url: storage_path(url) for url in urls if url}
+    missing = sorted({
+        path for path in paths.values()
+        if path and (path not in cache or cache[path][0] - now < SIGNED_URL_REFRESH_SECONDS)
+    })
+    if missing:
+        signed = supabase.storage.from_(DOCUMENTS_BUCKET).create_signed_urls(missing, SIGNED_URL_TTL_SECONDS)
+        for item in signed:
+            if item["signedURL"]:
+                cache[item["path"]] = (now + SIGNED_URL_TTL_SECONDS, item["signedURL"])
+    return {url: cache[path][1] if path in cache else url for url, path in paths.items()}
+
+
+def _render_thumbnail(source: str, destination: str) -> bool:
+    """
+    Write a THUMBNAIL_SIZE PNG of an image, or of a PDF's first page (requires
+    pypdfium2), to destination. Returns False if the file cannot be previewed.
+    """
+    try:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            image.save(destination, "PNG")
+            return True
+    except Exception:
+        pass
+    if pypdfium2 is None:
+        return False
+    try:
+        pdf = pypdfium2.PdfDocument(source)
+        try:
+            image = pdf[0].render(scale=1).to_pil()
+        finally:
+            pdf.close()
+    except Exception:
+        return False
+    image.thumbnail(THUMBNAIL_SIZE)
+    image.save(destination, "PNG")
+    return True
+
+
+def thumbnail(supabase: Client, url: str):
+    """
+    Path of a small PNG preview of a stored document, or None if it cannot be
+    previewed. The document is downloaded (streamed to a temporary file) only
+    the first time; the result, including "no preview", is cached in
+    THUMBNAIL_DIR under a hash of the object path, which itself contains the
+    content hash, so a replaced document gets a new thumbnail.
+    """
+    path = storage_path(url)
+    if not path:
+        return None
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    name = hashlib.sha256(path.encode()).hexdigest()
+    destination = os.path.join(THUMBNAIL_DIR, f"{name}.png")
+    no_preview = os.path.join(THUMBNAIL_DIR, f"{name}.none")
+    if os.path.exists(destination):
+        return destination
+    if os.path.exists(no_preview):
+        return None
+
+    with tempfile.NamedTemporaryFile() as download:
+        try:
+            with open_document(supabase, url) as response:
+                for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    download.write(chunk)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                return None  # not cached: the next view tries again
+            open(no_preview, "w").close()
+            return None
+        except httpx.TransportError:
+            return None
+        download.flush()
+        # Render to a private name first so other sessions never see a partial file
+        partial = f"{destination}.{os.getpid()}.{id(download)}"
+        if _render_thumbnail(download.name, partial):
+            os.replace(partial, destination)
+            return destination
+        if os.path.exists(partial):
+            os.remove(partial)
+    open(no_preview, "w").close()
+    return None
+
+
+@contextmanager
+def open_document(supabase: Client, url: str):
+    """
+    Open a stored document by its URL for streaming, as the client's current user.
+    Documents in the bucket are read through the authenticated endpoint, so this
+    works for private buckets too.
+    Yields the httpx response; read it with response.iter_bytes(DOWNLOAD_CHUNK_SIZE)
+    so the document is never held in memory as a whole.
+    """
+    path = storage_path(url)
+    if path:
+        base = str(supabase.supabase_url).rstrip("/")
+        url = f"{base}/storage/v1/object/authenticated/{DOCUMENTS_BUCKET}/{quote(path)}"
+    with db.get_http_client().stream(
+        "GET", url, headers=_auth_headers(supabase), timeout=UPLOAD_TIMEOUT_SECONDS
+    ) as response:
+        response.raise_for_status()
+        yield response
+
+
+def upload_resumable(supabase: Client, bucket: str, path: str, file_obj, content_type: str, upsert: bool = False):
+    """
+    Upload file_obj to bucket/path using Supabase's TUS resumable upload endpoint.
+    The file is read and sent in UPLOAD_CHUNK_SIZE pieces, so at most one chunk is
+    held in memory. A failed chunk is resumed from the offset the server reports,
+    up to UPLOAD_MAX_RETRIES times in a row.
+    """
+    endpoint = f"{str(supabase.supabase_url).rstrip('/')}/storage/v1/upload/resumable"
+    size = file_size(file_obj)
+    headers = {
+        **_auth_headers(supabase),
+        "tus-resumable": "1.0.0",
+        "x-upsert": "true" if upsert else "false",
+    }
+    metadata = {
+        "bucketName": bucket,
+        "objectName": path,
+        "contentType": content_type,
+        "cacheControl": "3600",
+    }
+
+    # The shared pool's client; never closed here.
+    http = db.get_http_client()
+
+    # 1. Create the upload; the server answers with its URL in Location.
+    create = http.post(
+        endpoint,
+        headers={**headers, "upload-length": str(size), "upload-metadata": _encode_metadata(metadata)},
+        timeout=UPLOAD_TIMEOUT_SECONDS,
+    )
+    create.raise_for_status()
+    upload_url = str(httpx.URL(endpoint).join(create.headers["location"]))
+
+    # 2. Send the file chunk by chunk, resuming from the server's offset on failure.
+    offset = 0
+    failures = 0
+    while offset < size:
+        file_obj.seek(offset)
+        chunk = file_obj.read(UPLOAD_CHUNK_SIZE)
+        try:
+            response = http.patch(
+                upload_url,
+                content=chunk,
+                headers={
+                    **headers,
+                    "upload-offset": str(offset),
+                    "content-type": "application/offset+octet-stream",
+                },
+                timeout=UPLOAD_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            offset = int(response.headers["upload-offset"])
+            failures = 0
+        except httpx.HTTPError:
+            failures += 1
+            if failures > UPLOAD_MAX_RETRIES:
+                raise
+            head = http.head(upload_url, headers=headers)
+            head.raise_for_status()
+            offset = int(head.headers["upload-offset"])
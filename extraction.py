@@ -0,0 +1,241 @@
+# extraction.py
+
+import io
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import pypdfium2
+except ImportError:  # optional: without it PDFs yield no text
+    pypdfium2 = None
+
+try:
+    import pytesseract
+    from PIL import Image
+except ImportError:  # optional: without it images and scanned PDFs yield no text
+    pytesseract = None
+
+# This module is imported by the worker processes too, so it must not import
+# Streamlit (or anything else that does) at module level.
+
+# Worker processes reading uploaded documents.
+EXTRACTION_WORKERS = int(os.environ.get("VATIFY_EXTRACTION_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+# Extracted fields are kept here by content hash (shared by all sessions of the process).
+EXTRACTION_CACHE_DIR = os.environ.get(
+    "VATIFY_EXTRACTION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "vatify_extraction")
+)
+
+# Only the first pages of a document are read; the fields are on page one or two.
+EXTRACTION_MAX_PAGES = 5
+
+# Larger files are not read at all.
+EXTRACTION_MAX_BYTES = 20 * 1024 * 1024
+
+# Outcomes kept in memory, most recently used first; older ones are read back
+# from EXTRACTION_CACHE_DIR when asked for again.
+EXTRACTION_RESULTS_KEPT = 256
+
+# Scanned PDF pages are rendered at this scale (1 = 72 dpi) for OCR.
+OCR_RENDER_SCALE = 3
+
+_ID_NUMBER = re.compile(r"\b(\d{6})\s?(\d{4})\s?(\d{3})\b")
+_TAX_NUMBER = re.compile(
+    r"(?:income\s+tax|tax\s+reference|tax)\s+(?:reference\s+)?(?:number|no\.?)\s*[:\-]?\s*([0-39]\d{9})\b",
+    re.IGNORECASE,
+)
+_COMPANY_NAME = re.compile(r"(?:enterprise|company|registered)\s+name\s*[:\-]?[ \t]*([^\n]+)", re.IGNORECASE)
+
+
+# ----------------- worker side -----------------
+
+def _luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit) * (2 if i % 2 else 1)
+        total += value - 9 if value > 9 else value
+    return total % 10 == 0
+
+
+def _ocr(image) -> str:
+    return pytesseract.image_to_string(image) if pytesseract else ""
+
+
+def extract_text(data: bytes, content_type: str = ""):
+    """
+    Returns (text, pages read) of a PDF or image. PDF text is read with
+    pypdfium2; pages without a text layer (scans) and images are OCRed with
+    pytesseract. Either library missing means ("", 0) for what it would read.
+    """
+    if content_type == "application/pdf" or data[:5] == b"%PDF-":
+        if pypdfium2 is None:
+            return "", 0
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            texts = []
+            pages = min(len(pdf), EXTRACTION_MAX_PAGES)
+            for index in range(pages):
+                page = pdf[index]
+                text = page.get_textpage().get_text_range()
+                if not text.strip():
+                    text = _ocr(page.render(scale=OCR_RENDER_SCALE).to_pil())
+                texts.append(text)
+            return "\n".join(texts), pages
+        finally:
+            pdf.close()
+
+    if pytesseract is None:
+        return "", 0
+    with Image.open(io.BytesIO(data)) as image:
+        return _ocr(image), 1
+
+
+def find_fields(text: str) -> dict:
+    """
+    Onboarding form values found in a document's text, by form field name:
+    "company_name" (CIPC "Enterprise Name" and similar labels),
+    "company_tax_number" (a labelled 10-digit SARS reference number) and
+    "id_number" (a 13-digit South African ID number with a valid birth date
+    and check digit). Fields that are not found are left out.
+    """
+    fields = {}
+    match = _COMPANY_NAME.search(text)
+    if match and match.group(1).strip():
+        fields["company_name"] = " ".join(match.group(1).split())
+    match = _TAX_NUMBER.search(text)
+    if match:
+        fields["company_tax_number"] = match.group(1)
+    for match in _ID_NUMBER.finditer(text):
+        digits = "".join(match.groups())
+        month, day = int(digits[2:4]), int(digits[4:6])
+        if 1 <= month <= 12 and 1 <= day <= 31 and _luhn_valid(digits):
+            fields["id_number"] = digits
+            break
+    return fields
+
+
+def extract_fields(data: bytes, content_type: str = "") -> dict:
+    """
+    Worker job: {"fields": find_fields(text), "pages": pages read, "seconds": time taken}.
+    """
+    started = time.perf_counter()
+    text, pages = extract_text(data, content_type)
+    return {"fields": find_fields(text), "pages": pages, "seconds": time.perf_counter() - started}
+
+
+# ----------------- app side -----------------
+
+_pool = None
+_futures = {}
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Returns the process-wide worker pool, started on first use. Workers are
+    spawned rather than forked, as forking would copy the Streamlit server's
+    threads' locks in whatever state they happen to be.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _cache_path(digest: str) -> str:
+    return os.path.join(EXTRACTION_CACHE_DIR, f"{digest}.json")
+
+
+def _keep(digest: str, outcome: dict):
+    """
+    Remember an outcome in memory, dropping the least recently used beyond
+    EXTRACTION_RESULTS_KEPT. Call with _lock held.
+    """
+    _results[digest] = outcome
+    _results.move_to_end(digest)
+    while len(_results) > EXTRACTION_RESULTS_KEPT:
+        _results.popitem(last=False)
+
+
+def _file_size(file_obj) -> int:
+    size = getattr(file_obj, "size", None)
+    if size is None:
+        file_obj.seek(0, 2)
+        size = file_obj.tell()
+    return size
+
+
+def request(digest: str, file_obj):
+    """
+    Start reading the fields of an uploaded file in a worker process, unless
+    the file (identified by its SHA-256 digest) has been read before.
+    Poll result(digest) for the outcome. Files over EXTRACTION_MAX_BYTES are
+    not read; the file is read outside the lock, so other sessions are not
+    held up meanwhile.
+    """
+    global _pool
+    with _lock:
+        if digest in _results or digest in _futures:
+            return
+    if os.path.exists(_cache_path(digest)):
+        return
+    if _file_size(file_obj) > EXTRACTION_MAX_BYTES:
+        with _lock:
+            _keep(digest, {"fields": {}, "pages": 0, "seconds": 0.0})
+        file_obj.seek(0)
+        return
+    file_obj.seek(0)
+    data = file_obj.read()
+    file_obj.seek(0)
+    with _lock:
+        if digest in _results or digest in _futures:
+            return
+        try:
+            _futures[digest] = _get_pool().submit(extract_fields, data, getattr(file_obj, "type", ""))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool
+            _pool = None
+            _futures[digest] = _get_pool().submit(extract_fields, data, getattr(file_obj, "type", ""))
+
+
+def result(digest: str):
+    """
+    The outcome of request(digest) as returned by extract_fields, or None while
+    it is still running (or was never requested). A failed read counts as a
+    document with no fields. Outcomes are cached on disk by digest.
+    """
+    with _lock:
+        if digest in _results:
+            _results.move_to_end(digest)
+            return _results[digest]
+        future = _futures.get(digest)
+        if future is None:
+            try:
+                with open(_cache_path(digest)) as cached:
+                    _keep(digest, json.load(cached))
+            except (OSError, ValueError):
+                return None
+            return _results[digest]
+        if not future.done():
+            return None
+        del _futures[digest]
+        try:
+            outcome = future.result()
+        except Exception as e:
+            outcome = {"fields": {}, "pages": 0, "seconds": 0.0, "error": str(e)}
+        _keep(digest, outcome)
+
+    if "error" not in outcome:
+        os.makedirs(EXTRACTION_CACHE_DIR, mode=0o700, exist_ok=True)
+        with open(_cache_path(digest), "w") as cached:
+            json.dump(outcome, cached)
+    return outcome
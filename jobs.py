@@ -0,0 +1,303 @@
+# jobs.py
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# SQLite file holding queued batches and jobs; survives restarts of the app.
+JOBS_DB_PATH = os.environ.get("VATIFY_JOBS_DB", os.path.join(tempfile.gettempdir(), "vatify_jobs.sqlite3"))
+
+# Worker threads per queue.
+JOB_WORKERS = int(os.environ.get("VATIFY_JOB_WORKERS", "4"))
+
+# A job is retried until it has been attempted this many times.
+JOB_MAX_ATTEMPTS = 5
+
+# Delay before retry n is JOB_BACKOFF_SECONDS * 2 ** (n - 1).
+JOB_BACKOFF_SECONDS = 2.0
+
+# How often idle workers look for due jobs (seconds).
+JOB_POLL_SECONDS = 0.5
+
+# Done and failed batches (and their jobs) are deleted this long after they were queued (seconds).
+JOB_RETENTION_SECONDS = 3600
+
+# How often idle workers delete expired batches (seconds).
+JOB_PURGE_SECONDS = 60.0
+
+_SCHEMA = """
+create table if not exists batches (
+    id text primary key,
+    queue text not null,
+    context text not null,
+    status text not null,
+    error text,
+    created_at real not null
+);
+create table if not exists jobs (
+    id integer primary key autoincrement,
+    batch_id text not null references batches(id),
+    payload text not null,
+    status text not null,
+    attempts integer not null default 0,
+    next_attempt_at real not null,
+    result text,
+    error text
+);
+create index if not exists jobs_due on jobs (status, next_attempt_at);
+"""
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class JobQueue:
+    """
+    Persistent background job queue: a SQLite table of jobs worked off by a
+    small pool of daemon threads, with retries and exponential backoff.
+    Jobs belong to a batch. Once every job in a batch has succeeded,
+    on_batch_complete(context, results) runs on the worker thread that finished
+    the last job. A batch fails if any job runs out of attempts or if
+    on_batch_complete raises; retry_failed() puts it back in the queue with a
+    new context.
+    handler(context, payload) does one job and returns a JSON-serializable result.
+    Batches are stored as JSON on local disk, so keep secrets there short-lived:
+    a batch's context is cleared once it is done, or once it has failed and no
+    job is left running, and done and failed batches are deleted
+    JOB_RETENTION_SECONDS after they were queued. on_batch_discarded(payloads),
+    if given, runs for each failed batch deleted, e.g. to remove its files.
+    """
+    def __init__(
+        self, name: str, handler, on_batch_complete, on_batch_discarded=None,
+        db_path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS,
+    ):
+        self.name = name
+        self.handler = handler
+        self.on_batch_complete = on_batch_complete
+        self.on_batch_discarded = on_batch_discarded
+        self._purged_at = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        os.chmod(db_path, 0o600)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            # Jobs left running by a previous process are picked up again
+            self._conn.execute(
+                "update jobs set status = 'queued' where status = 'running' "
+                "and batch_id in (select id from batches where queue = ?)",
+                (name,),
+            )
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True).start()
+
+    # ----------------- producer side -----------------
+
+    def submit(self, context: dict, payloads: list) -> str:
+        """
+        Queue one job per payload as a new batch and return the batch id.
+        context is shared by all jobs in the batch.
+        """
+        batch_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute("begin")
+            self._purge_expired(now)
+            self._conn.execute(
+                "insert into batches (id, queue, context, status, created_at) values (?, ?, ?, 'pending', ?)",
+                (batch_id, self.name, json.dumps(context), now),
+            )
+            self._conn.executemany(
+                "insert into jobs (batch_id, payload, status, next_attempt_at) values (?, ?, 'queued', ?)",
+                [(batch_id, json.dumps(payload), now) for payload in payloads],
+            )
+            self._conn.execute("commit")
+        self._wakeup.set()
+        return batch_id
+
+    def status(self, batch_id: str):
+        """
+        Progress of a batch: {"status", "error", "done", "total", "jobs"}, where
+        each job is {"payload", "status", "attempts", "error", "result"}. None if unknown.
+        """
+        with self._lock:
+            batch = self._conn.execute("select status, error from batches where id = ?", (batch_id,)).fetchone()
+            if batch is None:
+                return None
+            rows = self._conn.execute(
+                "select payload, status, attempts, error, result from jobs where batch_id = ? order by id", (batch_id,)
+            ).fetchall()
+        jobs = [
+            {
+                "payload": json.loads(payload),
+                "status": status,
+                "attempts": attempts,
+                "error": error,
+                "result": json.loads(result) if result is not None else None,
+            }
+            for payload, status, attempts, error, result in rows
+        ]
+        return {
+            "status": batch[0],
+            "error": batch[1],
+            "done": sum(1 for job in jobs if job["status"] == "done"),
+            "total": len(jobs),
+            "jobs": jobs,
+        }
+
+    def retry_failed(self, batch_id: str, context: dict):
+        """
+        Re-queue the failed jobs of a batch with a fresh set of attempts and a
+        new context (the stored one was cleared when the batch failed).
+        """
+        with self._lock:
+            self._conn.execute("begin")
+            self._conn.execute(
+                "update jobs set status = 'queued', attempts = 0, error = null, next_attempt_at = ? "
+                "where batch_id = ? and status = 'failed'",
+                (time.time(), batch_id),
+            )
+            self._conn.execute(
+                "update batches set status = 'pending', error = null, context = ? where id = ? and status = 'failed'",
+                (json.dumps(context), batch_id),
+            )
+            self._conn.execute("commit")
+        self._wakeup.set()
+        # A batch whose jobs all succeeded but whose completion step failed only needs that step again
+        self._complete_if_finished(batch_id)
+
+    def _purge_expired(self, now: float):
+        """
+        Delete this queue's done and failed batches queued over
+        JOB_RETENTION_SECONDS ago, passing the payloads of failed ones to
+        on_batch_discarded. Call with self._lock held.
+        """
+        self._purged_at = now
+        expired = "select id from batches where queue = ? and status in ('done', 'failed') and created_at < ?"
+        cutoff = now - JOB_RETENTION_SECONDS
+        if self.on_batch_discarded is not None:
+            failed = self._conn.execute(
+                "select id from batches where queue = ? and status = 'failed' and created_at < ?", (self.name, cutoff)
+            ).fetchall()
+            for (batch_id,) in failed:
+                rows = self._conn.execute("select payload from jobs where batch_id = ?", (batch_id,)).fetchall()
+                self.on_batch_discarded([json.loads(payload) for (payload,) in rows])
+        self._conn.execute(f"delete from jobs where batch_id in ({expired})", (self.name, cutoff))
+        self._conn.execute(f"delete from batches where id in ({expired})", (self.name, cutoff))
+
+    def _clear_failed_context(self, batch_id: str):
+        """
+        Clear the context of a failed batch once none of its jobs is queued or
+        running any more. Call with self._lock held.
+        """
+        self._conn.execute(
+            "update batches set context = '{}' where id = ? and status = 'failed' "
+            "and not exists (select 1 from jobs where batch_id = ? and status in ('queued', 'running'))",
+            (batch_id, batch_id),
+        )
+
+    # ----------------- worker side -----------------
+
+    def _claim(self):
+        """
+        Atomically take the oldest due job, or return None.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "update jobs set status = 'running', attempts = attempts + 1 "
+                "where id = (select jobs.id from jobs join batches on batches.id = jobs.batch_id "
+                "            where batches.queue = ? and jobs.status = 'queued' and jobs.next_attempt_at <= ? "
+                "            order by jobs.id limit 1) "
+                "returning id, batch_id, payload, attempts",
+                (self.name, time.time()),
+            ).fetchone()
+
+    def _work(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                if time.time() - self._purged_at >= JOB_PURGE_SECONDS:
+                    with self._lock:
+                        self._purge_expired(time.time())
+                self._wakeup.wait(JOB_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            job_id, batch_id, payload, attempts = job
+            with self._lock:
+                context = json.loads(
+                    self._conn.execute("select context from batches where id = ?", (batch_id,)).fetchone()[0]
+                )
+            try:
+                result = self.handler(context, json.loads(payload))
+            except Exception as e:
+                self._fail(job_id, batch_id, attempts, e)
+                continue
+            with self._lock:
+                self._conn.execute(
+                    "update jobs set status = 'done', result = ?, error = null where id = ?",
+                    (json.dumps(result), job_id),
+                )
+                self._clear_failed_context(batch_id)
+            self._complete_if_finished(batch_id)
+
+    def _fail(self, job_id: int, batch_id: str, attempts: int, error: Exception):
+        with self._lock:
+            if attempts >= JOB_MAX_ATTEMPTS:
+                self._conn.execute("begin")
+                self._conn.execute("update jobs set status = 'failed', error = ? where id = ?", (str(error), job_id))
+                self._conn.execute(
+                    "update batches set status = 'failed', error = ? where id = ?",
+                    (f"Gave up after {attempts} attempts", batch_id),
+                )
+                self._clear_failed_context(batch_id)
+                self._conn.execute("commit")
+            else:
+                delay = JOB_BACKOFF_SECONDS * 2 ** (attempts - 1)
+                self._conn.execute(
+                    "update jobs set status = 'queued', error = ?, next_attempt_at = ? where id = ?",
+                    (str(error), time.time() + delay, job_id),
+                )
+
+    def _complete_if_finished(self, batch_id: str):
+        """
+        Run on_batch_complete once every job in the batch is done.
+        The batch row is flipped to 'completing' first so only one thread runs it.
+        """
+        with self._lock:
+            claimed = self._conn.execute(
+                "update batches set status = 'completing' where id = ? and status = 'pending' "
+                "and not exists (select 1 from jobs where batch_id = ? and status != 'done') "
+                "returning context",
+                (batch_id, batch_id),
+            ).fetchone()
+            if claimed is None:
+                return
+            rows = self._conn.execute(
+                "select payload, result from jobs where batch_id = ? order by id", (batch_id,)
+            ).fetchall()
+        results = [(json.loads(payload), json.loads(result)) for payload, result in rows]
+        try:
+            self.on_batch_complete(json.loads(claimed[0]), results)
+        except Exception as e:
+            with self._lock:
+                self._conn.execute(
+                    "update batches set status = 'failed', error = ?, context = '{}' where id = ?", (str(e), batch_id)
+                )
+            return
+        with self._lock:
+            self._conn.execute("update batches set status = 'done', context = '{}' where id = ?", (batch_id,))
+
+
+def get_queue(name: str, handler, on_batch_complete, on_batch_discarded=None) -> JobQueue:
+    """
+    Returns the process-wide queue called name, starting it (and its workers)
+    on first use. Queued work from a previous run of the process resumes then.
+    """
+    with _queues_lock:
+        if name not in _queues:
+            _queues[name] = JobQueue(name, handler, on_batch_complete, on_batch_discarded)
+        return _queues[name]
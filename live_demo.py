@@ -3,6 +3,11 @@
 import streamlit as st
 import streamlit.components.v1 as components
 
+import metrics
+
+LIVE_DEMO_URL = "https://vatifyapp.replit.app"
+
+@metrics.instrument_page("live_demo")
 def render_live_demo_page():
     st.title("VATIFY Live Demo")
     st.write(
@@ -16,10 +21,7 @@ def render_live_demo_page():
         Explore the live demo below or click the link to visit the demo site.
         """
     )
-    st.markdown("[Visit Live Demo](https://vatifyapp.replit.app)")
+    st.markdown(f"[Visit Live Demo]({LIVE_DEMO_URL})")
     
     # Embed the demo inside an iframe.
-    demo_html = """
-    <iframe src="https://vatifyapp.replit.app" width="100%" height="600" frameborder="0" allowfullscreen></iframe>
-    """
-    components.html(demo_html, height=620)
+    components.iframe(LIVE_DEMO_URL, height=620)
@@ -0,0 +1,322 @@
+# metrics.py
+
+import builtins
+import contextvars
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import streamlit as st
+
+logger = logging.getLogger("vatify.metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets in the Prometheus export.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Port for the Prometheus /metrics endpoint; unset disables the exporter.
+METRICS_PORT = os.environ.get("VATIFY_METRICS_PORT")
+
+# Set VATIFY_PROFILE_IMPORTS=1 to log import costs: the cold-start import of
+# app.py's dependencies and a per-module breakdown of each lazily loaded page.
+PROFILE_IMPORTS = os.environ.get("VATIFY_PROFILE_IMPORTS") == "1"
+
+# Modules listed per lazily loaded page when profiling imports.
+PROFILE_TOP_MODULES = 15
+
+if PROFILE_IMPORTS and not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+# Process-wide totals: (kind, name) -> {"count", "errors", "seconds", "bytes", "buckets"}
+_series = {}
+_series_lock = threading.Lock()
+
+# Calls recorded during the current script run (None outside a run).
+_current_run = contextvars.ContextVar("vatify_metrics_run", default=None)
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def record(kind: str, name: str, seconds: float, nbytes: int = 0, error: bool = False):
+    """
+    Record one timed call. kind groups calls ("http", "page", "import"), name identifies
+    the call within its kind (e.g. "GET rest/user_onboarding" or "onboarding").
+    The call is added to the process-wide totals, to the current script run (if
+    any) and logged as a structured DEBUG line on the "vatify.metrics" logger.
+    """
+    with _series_lock:
+        series = _series.setdefault((kind, name), {
+            "count": 0,
+            "errors": 0,
+            "seconds": 0.0,
+            "bytes": 0,
+            "buckets": [0] * len(LATENCY_BUCKETS),
+        })
+        series["count"] += 1
+        series["errors"] += int(error)
+        series["seconds"] += seconds
+        series["bytes"] += nbytes
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                series["buckets"][i] += 1
+
+    call = {"kind": kind, "name": name, "ms": round(seconds * 1000, 1), "bytes": nbytes, "error": error}
+    run = _current_run.get()
+    if run is not None:
+        run.append(call)
+    logger.debug(json.dumps(call))
+
+
+class timed:
+    """
+    Context manager recording the time spent in its block, including blocks left
+    by an exception (such as the one st.rerun() raises).
+    """
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+def instrument_page(name: str):
+    """
+    Decorator recording each call of a page render function as kind "page".
+    """
+    def decorator(render):
+        @wraps(render)
+        def wrapper(*args, **kwargs):
+            with timed("page", name):
+                return render(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _ImportProfiler:
+    """
+    Times every module first imported while active (cumulative: a module's
+    time includes the modules it imports) by wrapping builtins.__import__.
+    Only used with PROFILE_IMPORTS, as it slows imports in all threads slightly.
+    """
+    def __enter__(self):
+        self.seconds = {}
+        self._import = builtins.__import__
+
+        def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return self._import(name, globals, locals, fromlist, level)
+            start = time.perf_counter()
+            try:
+                return self._import(name, globals, locals, fromlist, level)
+            finally:
+                self.seconds.setdefault(name, time.perf_counter() - start)
+
+        builtins.__import__ = profiled_import
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        builtins.__import__ = self._import
+        return False
+
+
+# Modules fully imported through import_module, and the lock held while one
+# is imported: sys.modules already holds a module while another thread is
+# still running its body, so it cannot tell whether the import has finished.
+_imported = set()
+_import_lock = threading.Lock()
+
+
+def import_module(name: str):
+    """
+    Import a module on first use (e.g. a page on first navigation) and record
+    how long the import took as kind "import". Later calls cost a set lookup;
+    sessions arriving during the first import wait for it to finish.
+    """
+    if name in _imported:
+        return sys.modules[name]
+    with _import_lock:
+        if name in _imported:
+            return sys.modules[name]
+        if name in sys.modules:
+            # Imported elsewhere first; importlib waits if that is still running
+            module = importlib.import_module(name)
+            _imported.add(name)
+            return module
+        start = time.perf_counter()
+        if PROFILE_IMPORTS:
+            with _ImportProfiler() as profiler:
+                module = importlib.import_module(name)
+        else:
+            module = importlib.import_module(name)
+        seconds = time.perf_counter() - start
+        _imported.add(name)
+    record("import", name, seconds)
+
+    if PROFILE_IMPORTS:
+        slowest = sorted(profiler.seconds.items(), key=lambda item: item[1], reverse=True)[:PROFILE_TOP_MODULES]
+        logger.info(
+            "imported %s in %.1f ms; slowest new modules: %s",
+            name,
+            seconds * 1000,
+            ", ".join(f"{module_name} {module_seconds * 1000:.1f} ms" for module_name, module_seconds in slowest),
+        )
+    return module
+
+
+_cold_start_logged = False
+
+
+def record_script_imports(seconds: float):
+    """
+    Record the time a script run spent on its top-level imports as kind
+    "import". The first run of the process pays the cold-start cost, which is
+    also logged when PROFILE_IMPORTS is set; later runs find every module cached.
+    """
+    global _cold_start_logged
+    record("import", "app", seconds)
+    if PROFILE_IMPORTS and not _cold_start_logged:
+        _cold_start_logged = True
+        logger.info("cold start: app.py imports took %.1f ms", seconds * 1000)
+
+
+def _call_name(request: httpx.Request) -> str:
+    """
+    Low-cardinality name for a Supabase request, e.g. "GET rest/user_onboarding",
+    "POST rest/rpc/submit_onboarding" or "POST storage/object". User ids and
+    object paths are left out so the number of series stays small.
+    """
+    parts = request.url.path.strip("/").split("/")
+    service = parts[0] if parts else ""
+    resource = parts[2] if len(parts) > 2 else ""
+    if resource == "rpc" and len(parts) > 3:
+        resource = f"rpc/{parts[3]}"
+    return f"{request.method} {service}/{resource}".rstrip("/")
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """
+    httpx transport wrapper recording latency (until response headers) and
+    payload size (request plus response Content-Length) of every request.
+    """
+    def __init__(self, transport: httpx.BaseTransport):
+        self._transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        name = _call_name(request)
+        sent = int(request.headers.get("content-length", 0))
+        start = time.perf_counter()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            record("http", name, time.perf_counter() - start, sent, error=True)
+            raise
+        received = int(response.headers.get("content-length", 0))
+        record("http", name, time.perf_counter() - start, sent + received, error=response.status_code >= 400)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+def start_run():
+    """
+    Start collecting the calls made during this script run (including worker
+    threads started with contextvars.copy_context()). Returns a token for finish_run.
+    """
+    return _current_run.set([])
+
+
+def finish_run(token) -> list:
+    """
+    Stop collecting and return the calls recorded since start_run.
+    """
+    calls = _current_run.get() or []
+    _current_run.reset(token)
+    return calls
+
+
+def prometheus_text() -> str:
+    """
+    Render the process-wide totals in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP vatify_call_seconds Latency of Supabase calls and page renders.",
+        "# TYPE vatify_call_seconds histogram",
+    ]
+    with _series_lock:
+        snapshot = {key: dict(value, buckets=list(value["buckets"])) for key, value in _series.items()}
+    for (kind, name), series in sorted(snapshot.items()):
+        labels = f'kind="{kind}",name="{name}"'
+        for bound, count in zip(LATENCY_BUCKETS, series["buckets"]):
+            lines.append(f'vatify_call_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'vatify_call_seconds_bucket{{{labels},le="+Inf"}} {series["count"]}')
+        lines.append(f"vatify_call_seconds_sum{{{labels}}} {series['seconds']}")
+        lines.append(f"vatify_call_seconds_count{{{labels}}} {series['count']}")
+    lines.append("# HELP vatify_call_bytes_total Payload bytes of Supabase calls.")
+    lines.append("# TYPE vatify_call_bytes_total counter")
+    for (kind, name), series in sorted(snapshot.items()):
+        lines.append(f'vatify_call_bytes_total{{kind="{kind}",name="{name}"}} {series["bytes"]}')
+    lines.append("# HELP vatify_call_errors_total Failed Supabase calls.")
+    lines.append("# TYPE vatify_call_errors_total counter")
+    for (kind, name), series in sorted(snapshot.items()):
+        lines.append(f'vatify_call_errors_total{{kind="{kind}",name="{name}"}} {series["errors"]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_exporter():
+    """
+    Serve /metrics on VATIFY_METRICS_PORT from a daemon thread.
+    Does nothing if the port is not configured or the exporter already runs.
+    """
+    global _exporter
+    if not METRICS_PORT:
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+            threading.Thread(target=_exporter.serve_forever, name="metrics-exporter", daemon=True).start()
+
+
+def render_debug_panel(calls: list):
+    """
+    Sidebar panel (for admins) listing the calls made during the previous run.
+    """
+    with st.sidebar.expander("⏱️ Performance"):
+        http_calls = [call for call in calls if call["kind"] == "http"]
+        st.caption(
+            f"Last run: {len(http_calls)} Supabase calls, "
+            f"{sum(call['ms'] for call in http_calls):.0f} ms, "
+            f"{sum(call['bytes'] for call in http_calls) / 1024:.1f} KiB"
+        )
+        if calls:
+            st.dataframe(calls, hide_index=True, use_container_width=True)
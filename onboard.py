@@ -1,38 +1,632 @@
 # onboard.py
 
+import io
+import os
+import shutil
+import tempfile
+import time
+
 import streamlit as st
+from PIL import Image, ImageOps
 from supabase import Client
 
-def upload_document_to_supabase(supabase: Client, file_obj, file_name: str):
+try:
+    import pikepdf
+except ImportError:  # optional: without it PDFs are uploaded unchanged
+    pikepdf = None
+
+import db
+import documents
+import extraction
+import jobs
+import metrics
+
+# Files wait here until a background upload job has stored them.
+UPLOAD_SPOOL_DIR = os.environ.get("VATIFY_UPLOAD_SPOOL", os.path.join(tempfile.gettempdir(), "vatify_upload_spool"))
+
+# How often the upload progress panel refreshes (seconds).
+UPLOAD_PROGRESS_REFRESH_SECONDS = 2
+
+# Draft autosave writes the changed form fields at most once per this many seconds.
+DRAFT_FLUSH_SECONDS = 10
+
+# How often the pre-fill suggestions panel checks for finished extractions (seconds).
+PREFILL_REFRESH_SECONDS = 2
+
+# Pre-upload processing: images are downscaled so neither side exceeds
+# IMAGE_MAX_DIMENSION pixels and JPEGs are re-encoded at IMAGE_JPEG_QUALITY.
+IMAGE_MAX_DIMENSION = 2000
+IMAGE_JPEG_QUALITY = 80
+# Re-save PDFs linearized with compressed object streams (requires pikepdf).
+COMPRESS_PDFS = True
+
+# Display labels for the document_uploads URL columns.
+DOCUMENT_LABELS = {
+    "cipc_document_url": "CIPC Document",
+    "id_document_url": "ID Document",
+    "tax_clearance_url": "Tax Clearance Document",
+    "power_of_attorney_url": "Signed Power of Attorney",
+    "proof_of_address_url": "Proof of Address",
+    "other_documents_url": "Other Documents",
+}
+
+# Uploads read for form values (see extraction.py), and the fields they can fill.
+PREFILL_DOCUMENTS = ["cipc_document_url", "id_document_url", "tax_clearance_url"]
+PREFILL_LABELS = {
+    "company_name": "Company Name",
+    "company_tax_number": "Company Tax Number",
+    "id_number": "ID Number/Passport Number",
+}
+
+class ProcessedFile(io.BytesIO):
+    """
+    In-memory result of prepare_document, shaped like Streamlit's UploadedFile.
+    """
+    def __init__(self, data: bytes, name: str, content_type: str):
+        super().__init__(data)
+        self.name = name
+        self.type = content_type
+        self.size = len(data)
+
+def _compress_image(file_obj, content_type: str) -> bytes:
+    """
+    Applies the EXIF orientation, downscales to IMAGE_MAX_DIMENSION and re-encodes
+    the image. EXIF and other metadata are not carried over.
+    """
+    with Image.open(file_obj) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        output = io.BytesIO()
+        if content_type == "image/png":
+            image.save(output, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+def _compress_pdf(file_obj):
+    """
+    Re-saves a PDF linearized (fast web view) with compressed object streams.
+    The result is written to a temporary file that stays in memory below
+    documents.STREAMING_UPLOAD_THRESHOLD and moves to disk above it, so large
+    PDFs are still streamed from disk rather than held in memory.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=documents.STREAMING_UPLOAD_THRESHOLD)
+    try:
+        with pikepdf.open(file_obj) as pdf:
+            pdf.save(
+                output,
+                linearize=True,
+                compress_streams=True,
+                object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            )
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+def prepare_document(file_obj):
+    """
+    Shrinks a document before it is uploaded.
+    JPG/PNG images are always re-encoded (which also strips EXIF data such as GPS
+    location). PDFs are recompressed when COMPRESS_PDFS is set and pikepdf is
+    installed, and only kept if the result is smaller. Anything else, or a file
+    that fails to process, is returned unchanged. A recompressed PDF is returned
+    as a temporary file; the caller closes it.
     """
-    Upload a file to Supabase Storage and return the public URL.
+    content_type = getattr(file_obj, "type", "") or ""
+    try:
+        if content_type in ("image/jpeg", "image/png"):
+            data = _compress_image(file_obj, content_type)
+        elif content_type == "application/pdf" and COMPRESS_PDFS and pikepdf is not None:
+            output = _compress_pdf(file_obj)
+            if documents.file_size(output) >= documents.file_size(file_obj):
+                output.close()
+                file_obj.seek(0)
+                return file_obj
+            output.type = content_type
+            return output
+        else:
+            return file_obj
+    except Exception:
+        # Fall back to uploading the original rather than failing the submit
+        file_obj.seek(0)
+        return file_obj
+    return ProcessedFile(data, getattr(file_obj, "name", ""), content_type)
+
+def upload_document_to_supabase(supabase: Client, file_obj, digest: str = None, user_id: str = None, user_email: str = None):
+    """
+    Upload a file to Supabase Storage and return (public URL, stored size in bytes).
     Assumes you have a bucket named 'documents'.
+    Paths are content-addressed by the SHA-256 digest of the original file
+    (computed here unless passed in), so identical files share one object.
+    The file is passed through prepare_document first.
+    Files of documents.STREAMING_UPLOAD_THRESHOLD bytes or more are streamed in chunks
+    through the resumable endpoint; smaller files are uploaded in one request.
     The filename will include the sanitized user's email.
+    user_id and user_email default to the current session; pass them explicitly
+    when calling from a worker thread, which has no access to st.session_state.
     """
     if not file_obj:
-        return None
+        return None, 0
 
     # Use the storage client property (not callable)
     storage = supabase.storage
-    bucket_name = "documents"
-    
-    # Get the user's email from session and sanitize it (replace "@" and "." with underscores)
-    user_email = st.session_state.get("user_email", "user")
+    bucket_name = documents.DOCUMENTS_BUCKET
+
+    if user_id is None:
+        user_id = st.session_state["user_id"]
+    if user_email is None:
+        user_email = st.session_state.get("user_email", "user")
+
+    # Sanitize the email (replace "@" and "." with underscores)
     sanitized_email = user_email.replace("@", "_").replace(".", "_")
+
+    if digest is None:
+        digest = documents.content_hash(file_obj)
+
+    # Create file path with user_id, sanitized email and content hash in the filename
+    file_path = f"{user_id}/{sanitized_email}_{digest}"
     
-    # Create file path with user_id and sanitized email in the filename
-    file_path = f"{st.session_state['user_id']}/{sanitized_email}_{file_name}"
-    
-    # Read file bytes and detect content type
-    file_bytes = file_obj.read()
+    # Compress/normalize before upload (runs on the calling worker thread)
+    original, file_obj = file_obj, prepare_document(file_obj)
+
+    # Detect content type
     content_type = getattr(file_obj, "type", "application/octet-stream")
-    
-    # Upload the file with the appropriate content-type
-    storage.from_(bucket_name).upload(file_path, file_bytes, file_options={"content-type": content_type})
-    
+
+    size = documents.file_size(file_obj)
+    try:
+        if size >= documents.STREAMING_UPLOAD_THRESHOLD:
+            # Large file: stream it in fixed-size chunks instead of reading it whole
+            documents.upload_resumable(supabase, bucket_name, file_path, file_obj, content_type, upsert=True)
+        else:
+            # Upload the file bytes with the appropriate content-type.
+            # Overwriting is safe: the path only ever holds this exact content.
+            file_bytes = file_obj.read()
+            storage.from_(bucket_name).upload(
+                file_path, file_bytes, file_options={"content-type": content_type, "upsert": "true"}
+            )
+    finally:
+        if file_obj is not original:
+            file_obj.close()
+
     # Return the public URL (already a string)
-    return storage.from_(bucket_name).get_public_url(file_path)
+    return storage.from_(bucket_name).get_public_url(file_path), size
+
+def plan_document_uploads(uploads: dict, known_hashes: dict = None):
+    """
+    Hash the selected files and work out which of them need uploading.
+    uploads maps a document_uploads URL column (e.g. "cipc_document_url") to a
+    file object. Files whose digest is in known_hashes (digest -> stored URL)
+    reuse that URL, and identical files selected for several columns are
+    uploaded once.
+    Returns (urls, hashes, pending): the URL of every file that is already
+    stored, the digest of every file, and digest -> (file_obj, [columns]) for
+    the files that still have to be uploaded.
+    """
+    urls, hashes, pending = {}, {}, {}
+    known_hashes = known_hashes or {}
+    for key, file_obj in uploads.items():
+        digest = documents.content_hash(file_obj)
+        hashes[key] = digest
+        if digest in known_hashes:
+            urls[key] = known_hashes[digest]
+        else:
+            pending.setdefault(digest, (file_obj, []))[1].append(key)
+    return urls, hashes, pending
+
+def _spool(file_obj) -> str:
+    """
+    Copy an uploaded file to UPLOAD_SPOOL_DIR (in blocks) and return its path.
+    """
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=UPLOAD_SPOOL_DIR)
+    file_obj.seek(0)
+    with os.fdopen(fd, "wb") as spool:
+        shutil.copyfileobj(file_obj, spool)
+    file_obj.seek(0)
+    return path
+
+def _job_client(context: dict) -> Client:
+    """
+    Supabase client acting as the user who queued the batch, with the access
+    token stored in the batch context. It never refreshes the token, so the
+    user's own session keeps the only refresh token.
+    """
+    return db.token_client(context["access_token"])
+
+def _upload_job(context: dict, payload: dict) -> dict:
+    """
+    Job handler: upload one spooled file and return {"url", "size"} of the stored object.
+    """
+    with open(payload["spool_path"], "rb") as file_obj:
+        file_obj.type = payload["content_type"]
+        url, size = upload_document_to_supabase(
+            _job_client(context), file_obj, payload["digest"], context["user_id"], context["user_email"]
+        )
+    return {"url": url, "size": size}
+
+def _finish_upload_batch(context: dict, results: list):
+    """
+    Batch completion: upsert the user_documents rows of the new files (URL,
+    hash and size), then delete the spooled copies.
+    """
+    doc_update = {}
+    for payload, result in results:
+        # Jobs queued before sizes were recorded returned the bare URL
+        if isinstance(result, str):
+            result = {"url": result, "size": None}
+        for key in payload["columns"]:
+            doc_update[db.DOCUMENT_TYPES[key]] = {
+                "url": result["url"], "hash": payload["digest"], "size": result["size"]
+            }
+    db.submit_onboarding(_job_client(context), documents=doc_update)
+    _delete_spooled([payload for payload, _ in results])
+
+def _delete_spooled(payloads: list):
+    """
+    Delete the spooled copies of a batch's files (after it completed, or when
+    a failed batch is discarded).
+    """
+    for payload in payloads:
+        if os.path.exists(payload["spool_path"]):
+            os.remove(payload["spool_path"])
+
+def _upload_queue() -> jobs.JobQueue:
+    return jobs.get_queue("document_uploads", _upload_job, _finish_upload_batch, _delete_spooled)
+
+def _upload_context(supabase: Client) -> dict:
+    """
+    Batch context for the upload jobs: the user and their current access token.
+    """
+    session = supabase.auth.get_session()
+    return {
+        "user_id": st.session_state["user_id"],
+        "user_email": st.session_state.get("user_email", "user"),
+        "access_token": session.access_token if session else None,
+    }
 
+def _uploads_pending() -> bool:
+    """
+    True while the session's last batch of background uploads is still running.
+    """
+    batch_id = st.session_state.get("upload_batch_id")
+    status = _upload_queue().status(batch_id) if batch_id else None
+    return status is not None and status["status"] in ("pending", "completing")
+
+def queue_document_uploads(supabase: Client, pending: dict) -> str:
+    """
+    Spool the pending files (see plan_document_uploads) and queue one background
+    upload job per file. When all have been stored, their user_documents rows are
+    upserted with URLs, hashes and sizes. Returns the batch id.
+    """
+    context = _upload_context(supabase)
+    payloads = [
+        {
+            "digest": digest,
+            "columns": columns,
+            "spool_path": _spool(file_obj),
+            "content_type": getattr(file_obj, "type", "application/octet-stream"),
+        }
+        for digest, (file_obj, columns) in pending.items()
+    ]
+    return _upload_queue().submit(context, payloads)
+
+@st.fragment(run_every=UPLOAD_PROGRESS_REFRESH_SECONDS)
+def render_upload_progress(supabase: Client):
+    """
+    Progress of the session's background document uploads, refreshed on its own
+    every few seconds. Reruns the whole page once the uploads have been stored.
+    Failed uploads are retried with the session's current access token.
+    """
+    batch_id = st.session_state.get("upload_batch_id")
+    if not batch_id:
+        return
+    status = _upload_queue().status(batch_id)
+    if status is None:
+        del st.session_state["upload_batch_id"]
+        return
+    if status["status"] == "done":
+        del st.session_state["upload_batch_id"]
+        db.invalidate(st.session_state["user_id"], "user_documents")
+        st.rerun()
+
+    st.progress(status["done"] / status["total"], text=f"Uploading documents: {status['done']}/{status['total']}")
+    for job in status["jobs"]:
+        labels = ", ".join(DOCUMENT_LABELS[key] for key in job["payload"]["columns"])
+        if job["status"] == "failed":
+            st.error(f"{labels}: {job['error']}")
+        elif job["status"] != "done" and job["error"]:
+            st.warning(f"{labels}: retrying after error ({job['attempts']} attempts): {job['error']}")
+        else:
+            st.caption(f"{labels}: {job['status']}")
+
+    if status["status"] == "failed":
+        st.error(f"Some documents could not be uploaded. {status['error'] or ''}")
+        if st.button("Retry Failed Uploads"):
+            _upload_queue().retry_failed(batch_id, _upload_context(supabase))
+
+def render_document_previews(supabase: Client, uploads: dict):
+    """
+    Thumbnails and signed links for the stored documents of a document_uploads
+    row, three to a row. All links are signed in one request.
+    """
+    stored = [(key, uploads[key]) for key in DOCUMENT_LABELS if uploads.get(key)]
+    if not stored:
+        st.caption("No documents uploaded yet.")
+        return
+    links = documents.signed_urls(supabase, [url for _, url in stored])
+    for row in range(0, len(stored), 3):
+        for col, (key, url) in zip(st.columns(3), stored[row:row + 3]):
+            with col:
+                preview = documents.thumbnail(supabase, url)
+                if preview:
+                    st.image(preview)
+                st.markdown(f"**{DOCUMENT_LABELS[key]}:** [View Document]({links[url]})")
+
+# Session state keys of the onboarding form fields, by field (documents by URL column).
+ONBOARD_KEYS = {
+    name: f"onboard_{name}"
+    for name in [
+        "contact_name", "contact_details", "company_name", "address", "id_number", "citizenship",
+        "company_tax_number", "email_address", "mobile", "no_efiling", "efiling_username",
+        "efiling_password", "e_sign", *DOCUMENT_LABELS,
+    ]
+}
+
+# Form fields kept in drafts; the eFiling password and the files are not.
+DRAFT_FIELDS = [name for name in ONBOARD_KEYS if name != "efiling_password" and name not in DOCUMENT_LABELS]
+
+def _load_draft(supabase: Client, user_id: str) -> dict:
+    """
+    The fields of the user's draft as read at the start of the session. Later
+    saves are tracked in "_draft_saved" by render_draft_autosave, not here.
+    """
+    if "_draft_fields" not in st.session_state:
+        draft = db.fetch_onboarding_draft(supabase, user_id)
+        st.session_state["_draft_fields"] = dict(draft["fields"]) if draft else {}
+        st.session_state["_draft_restored_at"] = draft["updated_at"] if draft else None
+    return st.session_state["_draft_fields"]
+
+def _clear_draft_state():
+    """
+    Forget the session's draft and form defaults (after a submit or discard).
+    """
+    for key in (
+        "_draft_fields", "_draft_restored_at", "_draft_saved", "_draft_flushed_at", "_draft_saved_label",
+        "_form_defaults", "_form_values",
+    ):
+        st.session_state.pop(key, None)
+
+def _with_draft(user_details: dict, fields: dict) -> dict:
+    """
+    user_details with the draft's values in place of the stored ones, for use
+    as the form's defaults. Checkboxes have no stored default, so their draft
+    values go straight into session state.
+    """
+    merged = dict(user_details or {})
+    for name, value in fields.items():
+        if name in ("no_efiling", "e_sign"):
+            st.session_state.setdefault(ONBOARD_KEYS[name], value)
+        elif name == "efiling_username":
+            merged["efiling_login_details"] = {**(merged.get("efiling_login_details") or {}), "username": value}
+        elif name in DRAFT_FIELDS:
+            merged[name] = value
+    return merged
+
+def _remember_fields():
+    """
+    Copy the form's current values to "_form_values". Streamlit drops widget
+    state when the user opens another page; this copy is kept, so the fields
+    can be restored when they come back.
+    """
+    values = st.session_state.setdefault("_form_values", {})
+    for name in DRAFT_FIELDS:
+        if ONBOARD_KEYS[name] in st.session_state:
+            values[name] = st.session_state[ONBOARD_KEYS[name]]
+
+@st.fragment(run_every=DRAFT_FLUSH_SECONDS)
+def render_draft_autosave(supabase: Client):
+    """
+    Save the form fields changed since the last save to the user's draft.
+    Field changes only update session state; this fragment reruns on its own
+    every DRAFT_FLUSH_SECONDS and writes whatever changed in one call, so at
+    most one write is made per DRAFT_FLUSH_SECONDS however much is typed.
+    """
+    current = {
+        name: st.session_state[ONBOARD_KEYS[name]] for name in DRAFT_FIELDS if ONBOARD_KEYS[name] in st.session_state
+    }
+    saved = st.session_state.get("_draft_saved")
+    if saved is None:
+        # First run: the fields hold their defaults, which are already stored
+        st.session_state["_draft_saved"] = current
+        return
+
+    changes = {name: value for name, value in current.items() if saved.get(name) != value}
+    flushed_at = st.session_state.get("_draft_flushed_at")
+    if changes and (flushed_at is None or time.monotonic() - flushed_at >= DRAFT_FLUSH_SECONDS):
+        db.save_onboarding_draft(supabase, changes)
+        db.invalidate(st.session_state["user_id"], "onboarding_drafts")
+        saved.update(changes)
+        st.session_state["_draft_flushed_at"] = time.monotonic()
+        st.session_state["_draft_saved_label"] = time.strftime("%H:%M:%S")
+    if "_draft_saved_label" in st.session_state:
+        st.caption(f"Draft saved at {st.session_state['_draft_saved_label']}.")
+
+@st.fragment
+def _render_personal_section(user_details: dict):
+    """
+    Contact and company fields, pre-filled from user_details if it exists.
+    """
+    # Pre-fill fields for edit mode if data exists; otherwise, use empty defaults
+    user_details = user_details or {}
+    contact_name = user_details.get("contact_name", "")
+    contact_details = user_details.get("contact_details", "")
+    company_name = user_details.get("company_name", "")
+    address = user_details.get("address", "")
+    id_number = user_details.get("id_number", "")
+    citizenship = user_details.get("citizenship", "South African")
+    company_tax_number = user_details.get("company_tax_number", "")
+    email_address = user_details.get("email_address", "")
+    mobile = user_details.get("mobile", "")
+
+    st.markdown("---")
+    st.subheader("Personal and Company Information")
+    # Row 1: Contact Name & Contact Details
+    col1, col2 = st.columns(2)
+    with col1:
+        st.text_input("Contact Name", contact_name, key=ONBOARD_KEYS["contact_name"])
+    with col2:
+        st.text_input("Contact Details", contact_details, key=ONBOARD_KEYS["contact_details"])
+
+    st.markdown("---")
+    # Row 2: Company Name & Address
+    col3, col4 = st.columns(2)
+    with col3:
+        st.text_input("Company Name", company_name, key=ONBOARD_KEYS["company_name"])
+    with col4:
+        st.text_area("Address", address, key=ONBOARD_KEYS["address"])
+
+    st.markdown("---")
+    # Row 3: ID/Passport & Citizenship
+    col5, col6 = st.columns(2)
+    with col5:
+        st.text_input("ID Number/Passport Number", id_number, key=ONBOARD_KEYS["id_number"])
+    with col6:
+        st.selectbox(
+            "Citizenship",
+            ["South African", "Non South African"],
+            index=["South African", "Non South African"].index(citizenship),
+            key=ONBOARD_KEYS["citizenship"],
+        )
+
+    st.markdown("---")
+    # Row 4: Company Tax Number & Email Address
+    col7, col8 = st.columns(2)
+    with col7:
+        st.text_input("Company Tax Number", company_tax_number, key=ONBOARD_KEYS["company_tax_number"])
+    with col8:
+        st.text_input("Email Address", email_address, key=ONBOARD_KEYS["email_address"])
+
+    st.markdown("---")
+    # Row 5: Mobile (single column)
+    st.text_input("Mobile", mobile, key=ONBOARD_KEYS["mobile"])
+    _remember_fields()
+
+@st.fragment
+def _render_efiling_section(user_details: dict):
+    """
+    eFiling credentials, or a checkbox to say there are none.
+    """
+    # eFiling details stored as JSON
+    efiling_json = (user_details or {}).get("efiling_login_details") or {}
+
+    st.markdown("---")
+    st.subheader("eFiling Details")
+    no_efiling = st.checkbox("I do NOT have eFiling credentials", key=ONBOARD_KEYS["no_efiling"])
+    if not no_efiling:
+        col9, col10 = st.columns(2)
+        with col9:
+            st.text_input("eFiling Username", efiling_json.get("username", ""), key=ONBOARD_KEYS["efiling_username"])
+        with col10:
+            st.text_input(
+                "eFiling Password", efiling_json.get("password", ""), type="password",
+                key=ONBOARD_KEYS["efiling_password"],
+            )
+    _remember_fields()
+
+@st.fragment
+def _render_poa_section():
+    """
+    Power of Attorney text with the eSign checkbox.
+    """
+    st.markdown("---")
+    # Power of Attorney Expander
+    with st.expander("Power of Attorney - Please Read & eSign"):
+        st.write(
+            """
+            **Power of Attorney**  
+            By granting this Power of Attorney, you authorize VATIFY to access and manage your SARS eFiling account for the purposes of VAT submissions, income tax returns, and communication with SARS on your behalf. Please review the terms carefully and eSign below if you agree.
+            """
+        )
+        st.checkbox("I agree and electronically sign this Power of Attorney.", key=ONBOARD_KEYS["e_sign"])
+    _remember_fields()
+
+@st.fragment
+def _render_uploads_section():
+    """
+    The six document uploaders (2 columns, 3 rows).
+    """
+    st.markdown("---")
+    st.subheader("Document Uploads")
+    st.write(
+        "Please upload the required documents using the buttons below. Ensure all files are clear and legible, as they will be used to verify your identity, address, and company details for your SARS eFiling registration. Accepted formats include PDF, JPG, and PNG."
+    )
+
+    # Create 3 rows with 2 columns each (2 cols, 3 rows)
+    columns = list(DOCUMENT_LABELS)
+    for row in range(0, len(columns), 2):
+        for col, key in zip(st.columns(2), columns[row:row + 2]):
+            with col:
+                st.file_uploader(DOCUMENT_LABELS[key], type=["pdf", "jpg", "png"], key=ONBOARD_KEYS[key])
+
+    # Read newly selected documents in worker processes for pre-fill suggestions
+    requested = st.session_state.setdefault("_prefill_digests", {})
+    had_requests = bool(requested)
+    for key in PREFILL_DOCUMENTS:
+        file_obj = st.session_state.get(ONBOARD_KEYS[key])
+        if file_obj is None:
+            requested.pop(key, None)
+        elif requested.get(key, (None,))[0] != file_obj.file_id:
+            digest = documents.content_hash(file_obj)
+            extraction.request(digest, file_obj)
+            requested[key] = (file_obj.file_id, digest)
+    if requested and not had_requests:
+        # The suggestions panel is only on the page while there is something to read
+        st.rerun()
+
+def _use_suggestion(name: str, value: str):
+    """
+    Put a suggested value into a form field. The field lives in another
+    fragment, so it is reset to the value as its default and the whole page
+    reruns; render_draft_autosave then saves it like a typed value.
+    """
+    st.session_state["_form_defaults"][name] = value
+    st.session_state.pop(ONBOARD_KEYS[name], None)
+    st.rerun()
+
+@st.fragment(run_every=PREFILL_REFRESH_SECONDS)
+def render_prefill_suggestions():
+    """
+    Form values found in the uploaded CIPC, ID and tax clearance documents,
+    each with a button to use it. Extraction runs in worker processes (see
+    extraction.py); this panel checks for finished results on its own every
+    PREFILL_REFRESH_SECONDS without rerunning the page.
+    """
+    requested = st.session_state.get("_prefill_digests") or {}
+    reading, suggestions = [], []
+    for key, (_, digest) in requested.items():
+        outcome = extraction.result(digest)
+        if outcome is None:
+            reading.append(DOCUMENT_LABELS[key])
+            continue
+        for name, value in outcome["fields"].items():
+            if st.session_state.get(ONBOARD_KEYS[name]) != value:
+                suggestions.append((name, value, key))
+
+    if reading:
+        st.caption(f"Reading {', '.join(reading)} for values to fill in...")
+    if suggestions:
+        st.markdown("**Found in your documents**")
+        for name, value, key in suggestions:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"{PREFILL_LABELS[name]}: **{value}** (from the {DOCUMENT_LABELS[key]})")
+            with col2:
+                if st.button("Use", key=f"prefill_{key}_{name}"):
+                    _use_suggestion(name, value)
+
+@metrics.instrument_page("onboarding")
 def render_onboarding_form(supabase: Client):
     """
     Renders the onboarding form and handles saving user data and documents.
@@ -56,18 +650,21 @@ def render_onboarding_form(supabase: Client):
 
     # Fetch existing onboarding data and document uploads
     user_id = st.session_state["user_id"]
-    user_details_response = supabase.table("user_onboarding").select("*").eq("user_id", user_id).execute()
-    user_details = user_details_response.data[0] if user_details_response.data else None
+    user_details = db.fetch_user_onboarding(supabase, user_id)
+    existing_docs = db.fetch_document_uploads(supabase, user_id) or {}
+    draft_fields = _load_draft(supabase, user_id)
 
-    doc_response = supabase.table("document_uploads").select("*").eq("user_id", user_id).execute()
-    existing_docs = doc_response.data[0] if doc_response.data else {}
+    # Background uploads from the last submit, if any
+    if "upload_batch_id" in st.session_state:
+        render_upload_progress(supabase)
 
-    # Determine if we should be in edit mode.
+    # Determine if we should be in edit mode (an unsubmitted draft is reopened).
     if "edit_mode" not in st.session_state:
-        st.session_state["edit_mode"] = True if (not user_details or not existing_docs) else False
+        st.session_state["edit_mode"] = not user_details or bool(draft_fields)
 
     # ----------------- VIEW MODE -----------------
-    if user_details and existing_docs and not st.session_state["edit_mode"]:
+    # Users with no documents stored have no document_uploads row, so the details decide
+    if user_details and not st.session_state["edit_mode"]:
         st.markdown("## Your Onboarding Details")
         st.markdown("---")
         with st.container():
@@ -98,18 +695,7 @@ def render_onboarding_form(supabase: Client):
         st.markdown("---")
         with st.expander("Show Uploaded Documents"):
             st.subheader("Uploaded Documents")
-            if existing_docs.get("cipc_document_url"):
-                st.markdown(f"**CIPC Document:** [View Document]({existing_docs.get('cipc_document_url')})")
-            if existing_docs.get("id_document_url"):
-                st.markdown(f"**ID Document:** [View Document]({existing_docs.get('id_document_url')})")
-            if existing_docs.get("tax_clearance_url"):
-                st.markdown(f"**Tax Clearance Document:** [View Document]({existing_docs.get('tax_clearance_url')})")
-            if existing_docs.get("power_of_attorney_url"):
-                st.markdown(f"**Signed Power of Attorney:** [View Document]({existing_docs.get('power_of_attorney_url')})")
-            if existing_docs.get("proof_of_address_url"):
-                st.markdown(f"**Proof of Address:** [View Document]({existing_docs.get('proof_of_address_url')})")
-            if existing_docs.get("other_documents_url"):
-                st.markdown(f"**Other Documents:** [View Document]({existing_docs.get('other_documents_url')})")
+            render_document_previews(supabase, existing_docs)
         
         st.markdown("---")
         if st.button("Edit Onboarding Details"):
@@ -119,118 +705,76 @@ def render_onboarding_form(supabase: Client):
 
     # ----------------- EDIT MODE -----------------
     # Provide a button to cancel editing and return to view mode (if data exists)
-    if st.session_state.get("edit_mode") and user_details and existing_docs:
+    if st.session_state.get("edit_mode") and user_details:
         if st.button("Cancel and Return to View"):
             st.session_state["edit_mode"] = False
+            st.session_state.pop("_form_values", None)
             st.rerun()
 
-    # Pre-fill fields for edit mode if data exists; otherwise, use empty defaults
-    contact_name = user_details["contact_name"] if user_details else ""
-    contact_details = user_details["contact_details"] if user_details else ""
-    company_name = user_details["company_name"] if user_details else ""
-    address = user_details["address"] if user_details else ""
-    id_number = user_details["id_number"] if user_details else ""
-    citizenship = user_details["citizenship"] if user_details else "South African"
-    company_tax_number = user_details["company_tax_number"] if user_details else ""
-    email_address = user_details["email_address"] if user_details else ""
-    mobile = user_details["mobile"] if user_details else ""
-
-    # eFiling details stored as JSON
-    efiling_json = user_details["efiling_login_details"] if (user_details and user_details.get("efiling_login_details")) else {}
-    efiling_username = efiling_json.get("username", "")
-    efiling_password = efiling_json.get("password", "")
-
-    st.markdown("---")
-    st.subheader("Personal and Company Information")
-    # Row 1: Contact Name & Contact Details
-    col1, col2 = st.columns(2)
-    with col1:
-        contact_name = st.text_input("Contact Name", contact_name)
-    with col2:
-        contact_details = st.text_input("Contact Details", contact_details)
-
-    st.markdown("---")
-    # Row 2: Company Name & Address
-    col3, col4 = st.columns(2)
-    with col3:
-        company_name = st.text_input("Company Name", company_name)
-    with col4:
-        address = st.text_area("Address", address)
-
-    st.markdown("---")
-    # Row 3: ID/Passport & Citizenship
-    col5, col6 = st.columns(2)
-    with col5:
-        id_number = st.text_input("ID Number/Passport Number", id_number)
-    with col6:
-        citizenship = st.selectbox(
-            "Citizenship",
-            ["South African", "Non South African"],
-            index=["South African", "Non South African"].index(citizenship)
-        )
-
-    st.markdown("---")
-    # Row 4: Company Tax Number & Email Address
-    col7, col8 = st.columns(2)
-    with col7:
-        company_tax_number = st.text_input("Company Tax Number", company_tax_number)
-    with col8:
-        email_address = st.text_input("Email Address", email_address)
-
-    st.markdown("---")
-    # Row 5: Mobile (single column)
-    mobile = st.text_input("Mobile", mobile)
-
-    st.markdown("---")
-    st.subheader("eFiling Details")
-    no_efiling = st.checkbox("I do NOT have eFiling credentials")
-    if no_efiling:
-        efiling_username = ""
-        efiling_password = ""
-    else:
-        col9, col10 = st.columns(2)
-        with col9:
-            efiling_username = st.text_input("eFiling Username", efiling_username)
-        with col10:
-            efiling_password = st.text_input("eFiling Password", efiling_password, type="password")
+    if st.session_state.get("_draft_restored_at"):
+        restored_at = st.session_state["_draft_restored_at"][:16].replace("T", " ")
+        st.info(f"Your unsubmitted changes from {restored_at} (UTC) have been restored.")
+        if st.button("Discard Draft"):
+            db.delete_onboarding_draft(supabase, user_id)
+            db.invalidate(user_id, "onboarding_drafts")
+            _clear_draft_state()
+            for name in DRAFT_FIELDS:
+                st.session_state.pop(ONBOARD_KEYS[name], None)
+            st.rerun()
 
-    st.markdown("---")
-    # Power of Attorney Expander
-    with st.expander("Power of Attorney - Please Read & eSign"):
-        st.write(
-            """
-            **Power of Attorney**  
-            By granting this Power of Attorney, you authorize VATIFY to access and manage your SARS eFiling account for the purposes of VAT submissions, income tax returns, and communication with SARS on your behalf. Please review the terms carefully and eSign below if you agree.
-            """
-        )
-        e_sign = st.checkbox("I agree and electronically sign this Power of Attorney.")
+    # Each section below is a fragment: changing one of its fields reruns only
+    # that section, not the page (and its Supabase reads) or the other sections.
+    # Field values live in session state under ONBOARD_KEYS and are read on submit.
+    # Unsubmitted values are saved as a draft by render_draft_autosave.
+    # The defaults only change while the fields have no widget state: Streamlit
+    # versions that derive a widget's identity from its parameters reset a field
+    # whose value= changes, which would replace what was typed since the last
+    # save. Widget state is gone when the edit opens and after a visit to
+    # another page; the fields then start from the values last seen in them
+    # (see _remember_fields), or those saved since the draft was read after a
+    # Cancel.
+    if not any(ONBOARD_KEYS[name] in st.session_state for name in DRAFT_FIELDS):
+        values = {
+            **draft_fields,
+            **(st.session_state.get("_draft_saved") or {}),
+            **st.session_state.get("_form_values", {}),
+        }
+        st.session_state["_form_defaults"] = _with_draft(user_details, values)
+    form_defaults = st.session_state["_form_defaults"]
+    _render_personal_section(form_defaults)
+    _render_efiling_section(form_defaults)
+    _render_poa_section()
+    _render_uploads_section()
+    if st.session_state.get("_prefill_digests"):
+        render_prefill_suggestions()
+    render_draft_autosave(supabase)
 
-    st.markdown("---")
-    st.subheader("Document Uploads")
-    st.write(
-        "Please upload the required documents using the buttons below. Ensure all files are clear and legible, as they will be used to verify your identity, address, and company details for your SARS eFiling registration. Accepted formats include PDF, JPG, and PNG."
-    )
+    # A second batch could finish before this one and be overwritten by it
+    uploading = _uploads_pending()
+    if uploading:
+        st.caption("You can submit again once the documents above have been uploaded.")
+    if st.button("Submit Onboarding", disabled=uploading):
+        form = {name: st.session_state.get(key) for name, key in ONBOARD_KEYS.items()}
+        contact_name = form["contact_name"]
+        contact_details = form["contact_details"]
+        company_name = form["company_name"]
+        address = form["address"]
+        id_number = form["id_number"]
+        citizenship = form["citizenship"]
+        company_tax_number = form["company_tax_number"]
+        email_address = form["email_address"]
+        mobile = form["mobile"]
+        no_efiling = form["no_efiling"]
+        efiling_username = form["efiling_username"] or ""
+        efiling_password = form["efiling_password"] or ""
+        e_sign = form["e_sign"]
+        cipc_doc = form["cipc_document_url"]
+        id_doc = form["id_document_url"]
+        tax_clearance_doc = form["tax_clearance_url"]
+        power_of_attorney_doc = form["power_of_attorney_url"]
+        proof_of_address_doc = form["proof_of_address_url"]
+        other_documents_doc = form["other_documents_url"]
 
-    # Create 3 rows with 2 columns each (2 cols, 3 rows)
-    row1_col1, row1_col2 = st.columns(2)
-    with row1_col1:
-        cipc_doc = st.file_uploader("CIPC Document", type=["pdf", "jpg", "png"])
-    with row1_col2:
-        id_doc = st.file_uploader("ID Document", type=["pdf", "jpg", "png"])
-
-    row2_col1, row2_col2 = st.columns(2)
-    with row2_col1:
-        tax_clearance_doc = st.file_uploader("Tax Clearance Document", type=["pdf", "jpg", "png"])
-    with row2_col2:
-        power_of_attorney_doc = st.file_uploader("Signed Power of Attorney", type=["pdf", "jpg", "png"])
-
-    row3_col1, row3_col2 = st.columns(2)
-    with row3_col1:
-        proof_of_address_doc = st.file_uploader("Proof of Address", type=["pdf", "jpg", "png"])
-    with row3_col2:
-        other_documents_doc = st.file_uploader("Other Documents", type=["pdf", "jpg", "png"])
-
-    if st.button("Submit Onboarding"):
         # 1. Build eFiling JSON
         efiling_details = {}
         if not no_efiling:
@@ -239,7 +783,6 @@ def render_onboarding_form(supabase: Client):
 
         # 2. Create data payload for user_onboarding
         data_payload = {
-            "user_id": user_id,
             "contact_name": contact_name,
             "contact_details": contact_details,
             "company_name": company_name,
@@ -253,39 +796,39 @@ def render_onboarding_form(supabase: Client):
             "e_sign": e_sign
         }
 
-        if user_details:
-            supabase.table("user_onboarding").update(data_payload).eq("user_id", user_id).execute()
-        else:
-            supabase.table("user_onboarding").insert(data_payload).execute()
-
-        # 3. Upload documents (replace if new file provided; otherwise, keep existing)
-        cipc_url = upload_document_to_supabase(supabase, cipc_doc, "cipc_doc") \
-            if cipc_doc else existing_docs.get("cipc_document_url", "")
-        id_url = upload_document_to_supabase(supabase, id_doc, "id_doc") \
-            if id_doc else existing_docs.get("id_document_url", "")
-        tax_url = upload_document_to_supabase(supabase, tax_clearance_doc, "tax_clearance_doc") \
-            if tax_clearance_doc else existing_docs.get("tax_clearance_url", "")
-        power_url = upload_document_to_supabase(supabase, power_of_attorney_doc, "power_of_attorney_doc") \
-            if power_of_attorney_doc else existing_docs.get("power_of_attorney_url", "")
-        proof_url = upload_document_to_supabase(supabase, proof_of_address_doc, "proof_of_address_doc") \
-            if proof_of_address_doc else existing_docs.get("proof_of_address_url", "")
-        other_url = upload_document_to_supabase(supabase, other_documents_doc, "other_documents_doc") \
-            if other_documents_doc else existing_docs.get("other_documents_url", "")
+        # 3. Work out which documents need uploading (replace if new file provided; otherwise, keep existing).
+        # Files whose content is already stored are not uploaded again.
+        selected_docs = {
+            "cipc_document_url": cipc_doc,
+            "id_document_url": id_doc,
+            "tax_clearance_url": tax_clearance_doc,
+            "power_of_attorney_url": power_of_attorney_doc,
+            "proof_of_address_url": proof_of_address_doc,
+            "other_documents_url": other_documents_doc,
+        }
+        stored_hashes = existing_docs.get("document_hashes") or {}
+        known_hashes = {
+            digest: existing_docs[key] for key, digest in stored_hashes.items() if existing_docs.get(key)
+        }
+        stored_urls, new_hashes, pending = plan_document_uploads(
+            {key: doc for key, doc in selected_docs.items() if doc}, known_hashes
+        )
 
+        # 4. Save details and documents in one round-trip. Only documents whose
+        # content is already stored are written now (and unchanged ones are
+        # skipped by the database); documents being replaced keep the old file
+        # until the background upload has finished.
         doc_payload = {
-            "user_id": user_id,
-            "cipc_document_url": cipc_url,
-            "id_document_url": id_url,
-            "tax_clearance_url": tax_url,
-            "power_of_attorney_url": power_url,
-            "proof_of_address_url": proof_url,
-            "other_documents_url": other_url
+            db.DOCUMENT_TYPES[key]: {"url": url, "hash": new_hashes[key]} for key, url in stored_urls.items()
         }
+        db.submit_onboarding(supabase, details=data_payload, documents=doc_payload)
+        # The database deletes the draft along with the submit
+        db.invalidate(user_id, "user_onboarding", "user_documents", "onboarding_drafts")
+        _clear_draft_state()
 
-        if existing_docs:
-            supabase.table("document_uploads").update(doc_payload).eq("user_id", user_id).execute()
-        else:
-            supabase.table("document_uploads").insert(doc_payload).execute()
+        # 5. Hand the new files to the background upload queue
+        if pending:
+            st.session_state["upload_batch_id"] = queue_document_uploads(supabase, pending)
 
         st.success("Onboarding details submitted successfully!")
         st.session_state["edit_mode"] = False
@@ -0,0 +1,7 @@
+-- 001_document_hashes.sql
+-- SHA-256 digests of the stored documents, keyed by URL column,
+-- e.g. {"cipc_document_url": "9f86d0..."}. Used to skip re-uploading
+-- files whose content is already in storage.
+
+alter table public.document_uploads
+    add column if not exists document_hashes jsonb not null default '{}'::jsonb;
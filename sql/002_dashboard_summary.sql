@@ -0,0 +1,24 @@
+-- 002_dashboard_summary.sql
+-- One row per user with everything the Home dashboard and the admin user
+-- list display, so each needs a single narrow query.
+-- security_invoker makes the view respect the callers' row level security.
+
+create or replace view public.dashboard_summary
+with (security_invoker = true) as
+select
+    coalesce(o.user_id, d.user_id) as user_id,
+    o.contact_name,
+    o.email_address,
+    o.company_name,
+    o.user_id is not null as onboarding_complete,
+    (
+        (coalesce(d.cipc_document_url, '') <> '')::int
+        + (coalesce(d.id_document_url, '') <> '')::int
+        + (coalesce(d.tax_clearance_url, '') <> '')::int
+        + (coalesce(d.power_of_attorney_url, '') <> '')::int
+    ) as documents_uploaded,
+    coalesce(o.contact_name, '') <> ''
+        and coalesce(o.company_name, '') <> ''
+        and coalesce(o.email_address, '') <> '' as profile_complete
+from public.user_onboarding o
+full outer join public.document_uploads d on d.user_id = o.user_id;
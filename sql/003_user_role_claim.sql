@@ -0,0 +1,34 @@
+-- 003_user_role_claim.sql
+-- Custom access token hook that copies the user's role from user_roles into
+-- a "user_role" claim, so the app can read the role from the session token
+-- instead of querying user_roles.
+-- Enable it under Authentication > Hooks > Customize Access Token (JWT) Claims.
+
+create or replace function public.custom_access_token_hook(event jsonb)
+returns jsonb
+language plpgsql
+stable
+as $$
+declare
+    claims jsonb;
+    user_role text;
+begin
+    select role into user_role
+    from public.user_roles
+    where user_id = (event->>'user_id')::uuid;
+
+    claims := event->'claims';
+    claims := jsonb_set(claims, '{user_role}', to_jsonb(coalesce(user_role, 'user')));
+    return jsonb_set(event, '{claims}', claims);
+end;
+$$;
+
+grant usage on schema public to supabase_auth_admin;
+grant execute on function public.custom_access_token_hook to supabase_auth_admin;
+revoke execute on function public.custom_access_token_hook from authenticated, anon, public;
+
+grant select on table public.user_roles to supabase_auth_admin;
+create policy "Auth admin can read user roles" on public.user_roles
+    as permissive for select
+    to supabase_auth_admin
+    using (true);
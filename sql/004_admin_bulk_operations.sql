@@ -0,0 +1,95 @@
+-- 004_admin_bulk_operations.sql
+-- Review tracking and a single RPC applying an admin action to many users,
+-- so bulk actions cost one round-trip per chunk instead of one per user.
+-- The function runs with the owner's rights but only for callers whose
+-- user_roles row says 'admin'.
+
+alter table public.user_onboarding
+    add column if not exists reviewed_at timestamptz,
+    add column if not exists reviewed_by uuid references auth.users (id);
+
+-- Expose review state to the admin user list (new columns go last).
+create or replace view public.dashboard_summary
+with (security_invoker = true) as
+select
+    coalesce(o.user_id, d.user_id) as user_id,
+    o.contact_name,
+    o.email_address,
+    o.company_name,
+    o.user_id is not null as onboarding_complete,
+    (
+        (coalesce(d.cipc_document_url, '') <> '')::int
+        + (coalesce(d.id_document_url, '') <> '')::int
+        + (coalesce(d.tax_clearance_url, '') <> '')::int
+        + (coalesce(d.power_of_attorney_url, '') <> '')::int
+    ) as documents_uploaded,
+    coalesce(o.contact_name, '') <> ''
+        and coalesce(o.company_name, '') <> ''
+        and coalesce(o.email_address, '') <> '' as profile_complete,
+    o.reviewed_at
+from public.user_onboarding o
+full outer join public.document_uploads d on d.user_id = o.user_id;
+
+-- action is 'mark_reviewed', 'set_role' (with new_role) or 'reset_onboarding'.
+-- Returns one row per requested user: outcome 'updated', 'not_found' or 'error'.
+create or replace function public.admin_bulk_update(action text, user_ids uuid[], new_role text default null)
+returns table (user_id uuid, outcome text, detail text)
+language plpgsql
+security definer
+set search_path = public
+as $$
+#variable_conflict use_column
+begin
+    if not exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin') then
+        raise exception 'admin role required' using errcode = '42501';
+    end if;
+
+    if action = 'mark_reviewed' then
+        return query
+        with changed as (
+            update public.user_onboarding o
+            set reviewed_at = now(), reviewed_by = auth.uid()
+            where o.user_id = any(user_ids)
+            returning o.user_id
+        )
+        select ids.id, case when c.user_id is null then 'not_found' else 'updated' end, null::text
+        from unnest(user_ids) as ids(id)
+        left join changed c on c.user_id = ids.id;
+
+    elsif action = 'set_role' then
+        if new_role not in ('admin', 'user') then
+            raise exception 'unknown role: %', new_role using errcode = '22023';
+        end if;
+        return query
+        with changed as (
+            insert into public.user_roles (user_id, role)
+            select u.id, new_role from auth.users u where u.id = any(user_ids)
+            on conflict (user_id) do update set role = excluded.role
+            returning user_roles.user_id
+        )
+        select ids.id, case when c.user_id is null then 'not_found' else 'updated' end, null::text
+        from unnest(user_ids) as ids(id)
+        left join changed c on c.user_id = ids.id;
+
+    elsif action = 'reset_onboarding' then
+        return query
+        with removed_details as (
+            delete from public.user_onboarding o where o.user_id = any(user_ids) returning o.user_id
+        ), removed_documents as (
+            delete from public.document_uploads d where d.user_id = any(user_ids) returning d.user_id
+        )
+        select ids.id,
+               case when rd.user_id is null and rdoc.user_id is null then 'not_found' else 'updated' end,
+               null::text
+        from unnest(user_ids) as ids(id)
+        left join removed_details rd on rd.user_id = ids.id
+        left join removed_documents rdoc on rdoc.user_id = ids.id;
+
+    else
+        raise exception 'unknown action: %', action using errcode = '22023';
+    end if;
+end;
+$$;
+
+revoke execute on function public.admin_bulk_update from anon, public;
+grant execute on function public.admin_bulk_update to authenticated;
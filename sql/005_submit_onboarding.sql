@@ -0,0 +1,82 @@
+-- 005_submit_onboarding.sql
+-- Writes a user's onboarding details and/or document row in one transaction
+-- and one round-trip. Each table is inserted or updated with
+-- ON CONFLICT (user_id) semantics, so the app no longer reads first to choose.
+-- Only the keys present in `details` / `documents` are written; a null argument
+-- leaves that table alone. document_hashes is merged key by key.
+-- security invoker: row level security applies, and user_id is always the
+-- caller's own (auth.uid()), never taken from the arguments.
+
+create or replace function public.submit_onboarding(details jsonb default null, documents jsonb default null)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    uid uuid := auth.uid();
+begin
+    if uid is null then
+        raise exception 'not signed in' using errcode = '42501';
+    end if;
+
+    if details is not null then
+        insert into public.user_onboarding as o (
+            user_id, contact_name, contact_details, company_name, address, id_number, citizenship,
+            company_tax_number, email_address, mobile, efiling_login_details, e_sign
+        ) values (
+            uid,
+            coalesce(details->>'contact_name', ''),
+            coalesce(details->>'contact_details', ''),
+            coalesce(details->>'company_name', ''),
+            coalesce(details->>'address', ''),
+            coalesce(details->>'id_number', ''),
+            coalesce(details->>'citizenship', 'South African'),
+            coalesce(details->>'company_tax_number', ''),
+            coalesce(details->>'email_address', ''),
+            coalesce(details->>'mobile', ''),
+            coalesce(details->'efiling_login_details', '{}'::jsonb),
+            coalesce((details->>'e_sign')::boolean, false)
+        )
+        on conflict (user_id) do update set
+            contact_name = case when details ? 'contact_name' then excluded.contact_name else o.contact_name end,
+            contact_details = case when details ? 'contact_details' then excluded.contact_details else o.contact_details end,
+            company_name = case when details ? 'company_name' then excluded.company_name else o.company_name end,
+            address = case when details ? 'address' then excluded.address else o.address end,
+            id_number = case when details ? 'id_number' then excluded.id_number else o.id_number end,
+            citizenship = case when details ? 'citizenship' then excluded.citizenship else o.citizenship end,
+            company_tax_number = case when details ? 'company_tax_number' then excluded.company_tax_number else o.company_tax_number end,
+            email_address = case when details ? 'email_address' then excluded.email_address else o.email_address end,
+            mobile = case when details ? 'mobile' then excluded.mobile else o.mobile end,
+            efiling_login_details = case when details ? 'efiling_login_details' then excluded.efiling_login_details else o.efiling_login_details end,
+            e_sign = case when details ? 'e_sign' then excluded.e_sign else o.e_sign end;
+    end if;
+
+    if documents is not null then
+        insert into public.document_uploads as d (
+            user_id, cipc_document_url, id_document_url, tax_clearance_url, power_of_attorney_url,
+            proof_of_address_url, other_documents_url, document_hashes
+        ) values (
+            uid,
+            coalesce(documents->>'cipc_document_url', ''),
+            coalesce(documents->>'id_document_url', ''),
+            coalesce(documents->>'tax_clearance_url', ''),
+            coalesce(documents->>'power_of_attorney_url', ''),
+            coalesce(documents->>'proof_of_address_url', ''),
+            coalesce(documents->>'other_documents_url', ''),
+            coalesce(documents->'document_hashes', '{}'::jsonb)
+        )
+        on conflict (user_id) do update set
+            cipc_document_url = case when documents ? 'cipc_document_url' then excluded.cipc_document_url else d.cipc_document_url end,
+            id_document_url = case when documents ? 'id_document_url' then excluded.id_document_url else d.id_document_url end,
+            tax_clearance_url = case when documents ? 'tax_clearance_url' then excluded.tax_clearance_url else d.tax_clearance_url end,
+            power_of_attorney_url = case when documents ? 'power_of_attorney_url' then excluded.power_of_attorney_url else d.power_of_attorney_url end,
+            proof_of_address_url = case when documents ? 'proof_of_address_url' then excluded.proof_of_address_url else d.proof_of_address_url end,
+            other_documents_url = case when documents ? 'other_documents_url' then excluded.other_documents_url else d.other_documents_url end,
+            document_hashes = coalesce(d.document_hashes, '{}'::jsonb) || excluded.document_hashes;
+    end if;
+end;
+$$;
+
+revoke execute on function public.submit_onboarding from anon, public;
+grant execute on function public.submit_onboarding to authenticated;
@@ -0,0 +1,216 @@
+-- 006_user_documents.sql
+-- One row per stored document instead of one wide row per user, so a submit
+-- writes only the documents that changed, counts read only the rows that
+-- exist, and a new document type needs no new column.
+-- doc_type is the old URL column name without "_url" (e.g. 'cipc_document').
+-- document_uploads becomes a read-only view with the old shape for existing
+-- readers; the old table is kept as document_uploads_legacy until it is dropped.
+
+create table if not exists public.user_documents (
+    user_id uuid not null references auth.users (id) on delete cascade,
+    doc_type text not null,
+    url text not null,
+    hash text,
+    size bigint,
+    uploaded_at timestamptz not null default now(),
+    -- Also the (user_id, doc_type) index every read and upsert goes through
+    primary key (user_id, doc_type)
+);
+
+alter table public.user_documents enable row level security;
+
+create policy "Users manage their own documents" on public.user_documents
+    for all using (user_id = auth.uid()) with check (user_id = auth.uid());
+
+create policy "Admins read all documents" on public.user_documents
+    for select using (
+        exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin')
+    );
+
+-- Backfill: one row per non-empty URL column, with its hash from document_hashes.
+insert into public.user_documents (user_id, doc_type, url, hash)
+select d.user_id, c.doc_type, c.url, d.document_hashes->>(c.doc_type || '_url')
+from public.document_uploads d
+cross join lateral (values
+    ('cipc_document', d.cipc_document_url),
+    ('id_document', d.id_document_url),
+    ('tax_clearance', d.tax_clearance_url),
+    ('power_of_attorney', d.power_of_attorney_url),
+    ('proof_of_address', d.proof_of_address_url),
+    ('other_documents', d.other_documents_url)
+) as c(doc_type, url)
+where coalesce(c.url, '') <> ''
+on conflict (user_id, doc_type) do nothing;
+
+alter table public.document_uploads rename to document_uploads_legacy;
+
+-- The old row shape, pivoted from user_documents. Users with no documents have no row.
+create view public.document_uploads
+with (security_invoker = true) as
+select
+    user_id,
+    coalesce(max(url) filter (where doc_type = 'cipc_document'), '') as cipc_document_url,
+    coalesce(max(url) filter (where doc_type = 'id_document'), '') as id_document_url,
+    coalesce(max(url) filter (where doc_type = 'tax_clearance'), '') as tax_clearance_url,
+    coalesce(max(url) filter (where doc_type = 'power_of_attorney'), '') as power_of_attorney_url,
+    coalesce(max(url) filter (where doc_type = 'proof_of_address'), '') as proof_of_address_url,
+    coalesce(max(url) filter (where doc_type = 'other_documents'), '') as other_documents_url,
+    coalesce(jsonb_object_agg(doc_type || '_url', hash) filter (where hash is not null), '{}'::jsonb)
+        as document_hashes
+from public.user_documents
+group by user_id;
+
+-- Count the required documents from user_documents (same columns as 004).
+create or replace view public.dashboard_summary
+with (security_invoker = true) as
+select
+    coalesce(o.user_id, d.user_id) as user_id,
+    o.contact_name,
+    o.email_address,
+    o.company_name,
+    o.user_id is not null as onboarding_complete,
+    coalesce(d.documents_uploaded, 0) as documents_uploaded,
+    coalesce(o.contact_name, '') <> ''
+        and coalesce(o.company_name, '') <> ''
+        and coalesce(o.email_address, '') <> '' as profile_complete,
+    o.reviewed_at
+from public.user_onboarding o
+full outer join (
+    select user_id, count(*)::int as documents_uploaded
+    from public.user_documents
+    where doc_type in ('cipc_document', 'id_document', 'tax_clearance', 'power_of_attorney')
+    group by user_id
+) d on d.user_id = o.user_id;
+
+-- documents now maps doc_type -> {"url", "hash", "size"} and upserts one row
+-- per given document. Rows whose url and hash are unchanged are not rewritten
+-- (uploaded_at keeps its value). A document without a size (a reused file)
+-- takes the size of the user's stored document with the same hash, if any.
+create or replace function public.submit_onboarding(details jsonb default null, documents jsonb default null)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    uid uuid := auth.uid();
+begin
+    if uid is null then
+        raise exception 'not signed in' using errcode = '42501';
+    end if;
+
+    if details is not null then
+        insert into public.user_onboarding as o (
+            user_id, contact_name, contact_details, company_name, address, id_number, citizenship,
+            company_tax_number, email_address, mobile, efiling_login_details, e_sign
+        ) values (
+            uid,
+            coalesce(details->>'contact_name', ''),
+            coalesce(details->>'contact_details', ''),
+            coalesce(details->>'company_name', ''),
+            coalesce(details->>'address', ''),
+            coalesce(details->>'id_number', ''),
+            coalesce(details->>'citizenship', 'South African'),
+            coalesce(details->>'company_tax_number', ''),
+            coalesce(details->>'email_address', ''),
+            coalesce(details->>'mobile', ''),
+            coalesce(details->'efiling_login_details', '{}'::jsonb),
+            coalesce((details->>'e_sign')::boolean, false)
+        )
+        on conflict (user_id) do update set
+            contact_name = case when details ? 'contact_name' then excluded.contact_name else o.contact_name end,
+            contact_details = case when details ? 'contact_details' then excluded.contact_details else o.contact_details end,
+            company_name = case when details ? 'company_name' then excluded.company_name else o.company_name end,
+            address = case when details ? 'address' then excluded.address else o.address end,
+            id_number = case when details ? 'id_number' then excluded.id_number else o.id_number end,
+            citizenship = case when details ? 'citizenship' then excluded.citizenship else o.citizenship end,
+            company_tax_number = case when details ? 'company_tax_number' then excluded.company_tax_number else o.company_tax_number end,
+            email_address = case when details ? 'email_address' then excluded.email_address else o.email_address end,
+            mobile = case when details ? 'mobile' then excluded.mobile else o.mobile end,
+            efiling_login_details = case when details ? 'efiling_login_details' then excluded.efiling_login_details else o.efiling_login_details end,
+            e_sign = case when details ? 'e_sign' then excluded.e_sign else o.e_sign end;
+    end if;
+
+    if documents is not null then
+        insert into public.user_documents as d (user_id, doc_type, url, hash, size)
+        select
+            uid,
+            doc.key,
+            doc.value->>'url',
+            doc.value->>'hash',
+            coalesce(
+                (doc.value->>'size')::bigint,
+                (select s.size from public.user_documents s
+                 where s.user_id = uid and s.hash = doc.value->>'hash' and s.size is not null
+                 limit 1)
+            )
+        from jsonb_each(documents) as doc
+        on conflict (user_id, doc_type) do update set
+            url = excluded.url,
+            hash = excluded.hash,
+            size = excluded.size,
+            uploaded_at = now()
+        where (d.url, d.hash) is distinct from (excluded.url, excluded.hash);
+    end if;
+end;
+$$;
+
+-- reset_onboarding now deletes from user_documents (document_uploads is a view).
+create or replace function public.admin_bulk_update(action text, user_ids uuid[], new_role text default null)
+returns table (user_id uuid, outcome text, detail text)
+language plpgsql
+security definer
+set search_path = public
+as $$
+#variable_conflict use_column
+begin
+    if not exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin') then
+        raise exception 'admin role required' using errcode = '42501';
+    end if;
+
+    if action = 'mark_reviewed' then
+        return query
+        with changed as (
+            update public.user_onboarding o
+            set reviewed_at = now(), reviewed_by = auth.uid()
+            where o.user_id = any(user_ids)
+            returning o.user_id
+        )
+        select ids.id, case when c.user_id is null then 'not_found' else 'updated' end, null::text
+        from unnest(user_ids) as ids(id)
+        left join changed c on c.user_id = ids.id;
+
+    elsif action = 'set_role' then
+        if new_role not in ('admin', 'user') then
+            raise exception 'unknown role: %', new_role using errcode = '22023';
+        end if;
+        return query
+        with changed as (
+            insert into public.user_roles (user_id, role)
+            select u.id, new_role from auth.users u where u.id = any(user_ids)
+            on conflict (user_id) do update set role = excluded.role
+            returning user_roles.user_id
+        )
+        select ids.id, case when c.user_id is null then 'not_found' else 'updated' end, null::text
+        from unnest(user_ids) as ids(id)
+        left join changed c on c.user_id = ids.id;
+
+    elsif action = 'reset_onboarding' then
+        return query
+        with removed_details as (
+            delete from public.user_onboarding o where o.user_id = any(user_ids) returning o.user_id
+        ), removed_documents as (
+            delete from public.user_documents d where d.user_id = any(user_ids) returning d.user_id
+        )
+        select ids.id,
+               case when rd.user_id is null and rdoc.user_id is null then 'not_found' else 'updated' end,
+               null::text
+        from unnest(user_ids) as ids(id)
+        left join removed_details rd on rd.user_id = ids.id
+        left join (select distinct r.user_id from removed_documents r) rdoc on rdoc.user_id = ids.id;
+
+    else
+        raise exception 'unknown action: %', action using errcode = '22023';
+    end if;
+end;
+$$;
@@ -0,0 +1,63 @@
+-- 007_admin_change_feed.sql
+-- Lets the admin dashboard keep an in-memory copy of dashboard_summary up to
+-- date instead of re-querying it on every rerun (see admin_index.py):
+-- the underlying tables publish their changes to Supabase Realtime, and every
+-- summary row carries the time any of its sources last changed, so changes
+-- can also be polled with updated_at=gte.<cursor> when Realtime is unavailable.
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+alter table public.user_onboarding
+    add column if not exists updated_at timestamptz not null default now();
+alter table public.user_roles
+    add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists set_updated_at on public.user_onboarding;
+create trigger set_updated_at before update on public.user_onboarding
+    for each row execute function public.set_updated_at();
+
+drop trigger if exists set_updated_at on public.user_roles;
+create trigger set_updated_at before update on public.user_roles
+    for each row execute function public.set_updated_at();
+
+-- user_documents already has uploaded_at, which submit_onboarding sets on every change.
+create index if not exists user_onboarding_updated_at on public.user_onboarding (updated_at);
+
+alter publication supabase_realtime add table public.user_onboarding, public.user_documents, public.user_roles;
+
+-- role and updated_at go last, after the columns of 006.
+create or replace view public.dashboard_summary
+with (security_invoker = true) as
+select
+    coalesce(o.user_id, d.user_id) as user_id,
+    o.contact_name,
+    o.email_address,
+    o.company_name,
+    o.user_id is not null as onboarding_complete,
+    coalesce(d.documents_uploaded, 0) as documents_uploaded,
+    coalesce(o.contact_name, '') <> ''
+        and coalesce(o.company_name, '') <> ''
+        and coalesce(o.email_address, '') <> '' as profile_complete,
+    o.reviewed_at,
+    coalesce(r.role, 'user') as role,
+    greatest(o.updated_at, d.updated_at, r.updated_at) as updated_at
+from public.user_onboarding o
+full outer join (
+    select
+        user_id,
+        (count(*) filter (
+            where doc_type in ('cipc_document', 'id_document', 'tax_clearance', 'power_of_attorney')
+        ))::int as documents_uploaded,
+        max(uploaded_at) as updated_at
+    from public.user_documents
+    group by user_id
+) d on d.user_id = o.user_id
+left join public.user_roles r on r.user_id = coalesce(o.user_id, d.user_id);
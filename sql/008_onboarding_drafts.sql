@@ -0,0 +1,60 @@
+-- 008_onboarding_drafts.sql
+-- Unsubmitted onboarding form values, saved in the background while the user
+-- types (see onboard.render_draft_autosave) and restored on their next visit.
+-- fields maps form field names to values, e.g. {"contact_name": "Jane"};
+-- each save merges only the changed fields into it.
+-- The draft is deleted once the user submits the form.
+
+create table if not exists public.onboarding_drafts (
+    user_id uuid primary key references auth.users (id) on delete cascade,
+    fields jsonb not null default '{}'::jsonb,
+    updated_at timestamptz not null default now()
+);
+
+alter table public.onboarding_drafts enable row level security;
+
+create policy "Users manage their own draft" on public.onboarding_drafts
+    for all using (user_id = auth.uid()) with check (user_id = auth.uid());
+
+-- Merge changed fields into the caller's draft, creating it if needed.
+create or replace function public.save_onboarding_draft(changes jsonb)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+begin
+    if auth.uid() is null then
+        raise exception 'not signed in' using errcode = '42501';
+    end if;
+
+    insert into public.onboarding_drafts as d (user_id, fields)
+    values (auth.uid(), changes)
+    on conflict (user_id) do update set
+        fields = d.fields || excluded.fields,
+        updated_at = now();
+end;
+$$;
+
+revoke execute on function public.save_onboarding_draft from anon, public;
+grant execute on function public.save_onboarding_draft to authenticated;
+
+-- A user's own write of their onboarding details (a submit) ends the draft;
+-- admin changes such as mark_reviewed leave it alone.
+create or replace function public.discard_onboarding_draft()
+returns trigger
+language plpgsql
+security invoker
+set search_path = public
+as $$
+begin
+    if new.user_id = auth.uid() then
+        delete from public.onboarding_drafts where user_id = new.user_id;
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists discard_onboarding_draft on public.user_onboarding;
+create trigger discard_onboarding_draft after insert or update on public.user_onboarding
+    for each row execute function public.discard_onboarding_draft();
@@ -0,0 +1,39 @@
+-- 009_export_bucket.sql
+-- Admin export archives (see admin._run_export_job) hold every exported user's
+-- details and documents, so they get their own private bucket instead of the
+-- documents bucket. Each admin writes under <their user id>/; any admin may
+-- read and delete exports, so whichever admin exports next deletes every
+-- archive older than admin.EXPORT_RETENTION_SECONDS.
+
+insert into storage.buckets (id, name, public, allowed_mime_types)
+values ('exports', 'exports', false, array['application/zip'])
+on conflict (id) do update set public = false;
+
+create policy "Admins write their own exports" on storage.objects
+    for insert with check (
+        bucket_id = 'exports'
+        and (storage.foldername(name))[1] = auth.uid()::text
+        and exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin')
+    );
+
+create policy "Admins overwrite their own exports" on storage.objects
+    for update using (
+        bucket_id = 'exports'
+        and (storage.foldername(name))[1] = auth.uid()::text
+        and exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin')
+    );
+
+create policy "Admins read exports" on storage.objects
+    for select using (
+        bucket_id = 'exports'
+        and exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin')
+    );
+
+create policy "Admins delete exports" on storage.objects
+    for delete using (
+        bucket_id = 'exports'
+        and exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin')
+    );
+
+-- Exports written to the documents bucket before this migration are not moved;
+-- delete them from <admin id>/exports/ in the dashboard.
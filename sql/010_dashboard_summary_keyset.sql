@@ -0,0 +1,61 @@
+-- 010_dashboard_summary_keyset.sql
+-- dashboard_summary took user_id from coalesce(o.user_id, d.user_id) over a
+-- full outer join, so "user_id > <after> order by user_id limit n" (the admin
+-- list's keyset paging, db.fetch_users_page) could not use any index: every
+-- page built the whole join. The view is now keyed on user_roles, which has a
+-- row per user (written at sign-up, backfilled below), with the other tables
+-- joined per user through their user_id indexes. The predicate and ordering
+-- then run on the user_roles primary key.
+-- Users without onboarding details or documents now get a row too (not
+-- onboarded, 0 documents), so the admin list shows every registered user.
+
+insert into public.user_roles (user_id, role)
+select u.id, 'user' from auth.users u
+on conflict (user_id) do nothing;
+
+-- Admins read every role through the view. The check runs as the definer, as a
+-- policy on user_roles that queried user_roles itself would recurse.
+create or replace function public.is_admin()
+returns boolean
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select exists (select 1 from public.user_roles r where r.user_id = auth.uid() and r.role = 'admin');
+$$;
+
+revoke execute on function public.is_admin from anon, public;
+grant execute on function public.is_admin to authenticated;
+
+drop policy if exists "Admins read all roles" on public.user_roles;
+create policy "Admins read all roles" on public.user_roles
+    for select using (public.is_admin());
+
+-- Same columns as 007.
+create or replace view public.dashboard_summary
+with (security_invoker = true) as
+select
+    r.user_id,
+    o.contact_name,
+    o.email_address,
+    o.company_name,
+    o.user_id is not null as onboarding_complete,
+    coalesce(d.documents_uploaded, 0) as documents_uploaded,
+    coalesce(o.contact_name, '') <> ''
+        and coalesce(o.company_name, '') <> ''
+        and coalesce(o.email_address, '') <> '' as profile_complete,
+    o.reviewed_at,
+    coalesce(r.role, 'user') as role,
+    greatest(o.updated_at, d.updated_at, r.updated_at) as updated_at
+from public.user_roles r
+left join public.user_onboarding o on o.user_id = r.user_id
+left join lateral (
+    select
+        (count(*) filter (
+            where ud.doc_type in ('cipc_document', 'id_document', 'tax_clearance', 'power_of_attorney')
+        ))::int as documents_uploaded,
+        max(ud.uploaded_at) as updated_at
+    from public.user_documents ud
+    where ud.user_id = r.user_id
+) d on true;
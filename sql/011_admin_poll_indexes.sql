@@ -0,0 +1,9 @@
+-- 011_admin_poll_indexes.sql
+-- While Realtime is unavailable the admin index (admin_index.py) polls each of
+-- dashboard_summary's base tables for rows changed since its last poll,
+-- instead of filtering the view on its computed updated_at (a greatest() over
+-- joins and aggregates that no index can serve). These indexes serve those
+-- polls; user_onboarding (updated_at) is indexed in 007.
+
+create index if not exists user_documents_uploaded_at on public.user_documents (uploaded_at);
+create index if not exists user_roles_updated_at on public.user_roles (updated_at);
@@ -0,0 +1,81 @@
+-- 012_draft_discard_on_submit.sql
+-- The discard_onboarding_draft trigger of 008 deleted the draft on any write
+-- the user made to their own user_onboarding row, so saving the Profile page
+-- also threw away an unsubmitted onboarding draft. The draft is now deleted by
+-- submit_onboarding itself, when it writes the details; document-only calls
+-- (background upload batches) and every other write leave it alone.
+
+drop trigger if exists discard_onboarding_draft on public.user_onboarding;
+drop function if exists public.discard_onboarding_draft();
+
+-- As in 006, plus the draft delete.
+create or replace function public.submit_onboarding(details jsonb default null, documents jsonb default null)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    uid uuid := auth.uid();
+begin
+    if uid is null then
+        raise exception 'not signed in' using errcode = '42501';
+    end if;
+
+    if details is not null then
+        insert into public.user_onboarding as o (
+            user_id, contact_name, contact_details, company_name, address, id_number, citizenship,
+            company_tax_number, email_address, mobile, efiling_login_details, e_sign
+        ) values (
+            uid,
+            coalesce(details->>'contact_name', ''),
+            coalesce(details->>'contact_details', ''),
+            coalesce(details->>'company_name', ''),
+            coalesce(details->>'address', ''),
+            coalesce(details->>'id_number', ''),
+            coalesce(details->>'citizenship', 'South African'),
+            coalesce(details->>'company_tax_number', ''),
+            coalesce(details->>'email_address', ''),
+            coalesce(details->>'mobile', ''),
+            coalesce(details->'efiling_login_details', '{}'::jsonb),
+            coalesce((details->>'e_sign')::boolean, false)
+        )
+        on conflict (user_id) do update set
+            contact_name = case when details ? 'contact_name' then excluded.contact_name else o.contact_name end,
+            contact_details = case when details ? 'contact_details' then excluded.contact_details else o.contact_details end,
+            company_name = case when details ? 'company_name' then excluded.company_name else o.company_name end,
+            address = case when details ? 'address' then excluded.address else o.address end,
+            id_number = case when details ? 'id_number' then excluded.id_number else o.id_number end,
+            citizenship = case when details ? 'citizenship' then excluded.citizenship else o.citizenship end,
+            company_tax_number = case when details ? 'company_tax_number' then excluded.company_tax_number else o.company_tax_number end,
+            email_address = case when details ? 'email_address' then excluded.email_address else o.email_address end,
+            mobile = case when details ? 'mobile' then excluded.mobile else o.mobile end,
+            efiling_login_details = case when details ? 'efiling_login_details' then excluded.efiling_login_details else o.efiling_login_details end,
+            e_sign = case when details ? 'e_sign' then excluded.e_sign else o.e_sign end;
+
+        delete from public.onboarding_drafts where user_id = uid;
+    end if;
+
+    if documents is not null then
+        insert into public.user_documents as d (user_id, doc_type, url, hash, size)
+        select
+            uid,
+            doc.key,
+            doc.value->>'url',
+            doc.value->>'hash',
+            coalesce(
+                (doc.value->>'size')::bigint,
+                (select s.size from public.user_documents s
+                 where s.user_id = uid and s.hash = doc.value->>'hash' and s.size is not null
+                 limit 1)
+            )
+        from jsonb_each(documents) as doc
+        on conflict (user_id, doc_type) do update set
+            url = excluded.url,
+            hash = excluded.hash,
+            size = excluded.size,
+            uploaded_at = now()
+        where (d.url, d.hash) is distinct from (excluded.url, excluded.hash);
+    end if;
+end;
+$$;
@@ -0,0 +1,102 @@
+-- 013_user_role_on_submit.sql
+-- dashboard_summary is keyed on user_roles since 010, so a user without a
+-- user_roles row is missing from Home stats and the admin list. The row was
+-- only written by the sign-up page, from the client, and that insert can fail
+-- (e.g. with no session before the email is confirmed). submit_onboarding,
+-- the only writer of a user's onboarding details and documents, now makes sure
+-- the row exists first. The check runs as the definer: users cannot insert
+-- into user_roles themselves.
+
+create or replace function public.ensure_user_role()
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into public.user_roles (user_id, role)
+    select auth.uid(), 'user'
+    where auth.uid() is not null
+    on conflict (user_id) do nothing;
+$$;
+
+revoke execute on function public.ensure_user_role from anon, public;
+grant execute on function public.ensure_user_role to authenticated;
+
+-- Users who signed up since 010 without a row
+insert into public.user_roles (user_id, role)
+select u.id, 'user' from auth.users u
+on conflict (user_id) do nothing;
+
+-- As in 012, plus ensure_user_role().
+create or replace function public.submit_onboarding(details jsonb default null, documents jsonb default null)
+returns void
+language plpgsql
+security invoker
+set search_path = public
+as $$
+declare
+    uid uuid := auth.uid();
+begin
+    if uid is null then
+        raise exception 'not signed in' using errcode = '42501';
+    end if;
+
+    perform public.ensure_user_role();
+
+    if details is not null then
+        insert into public.user_onboarding as o (
+            user_id, contact_name, contact_details, company_name, address, id_number, citizenship,
+            company_tax_number, email_address, mobile, efiling_login_details, e_sign
+        ) values (
+            uid,
+            coalesce(details->>'contact_name', ''),
+            coalesce(details->>'contact_details', ''),
+            coalesce(details->>'company_name', ''),
+            coalesce(details->>'address', ''),
+            coalesce(details->>'id_number', ''),
+            coalesce(details->>'citizenship', 'South African'),
+            coalesce(details->>'company_tax_number', ''),
+            coalesce(details->>'email_address', ''),
+            coalesce(details->>'mobile', ''),
+            coalesce(details->'efiling_login_details', '{}'::jsonb),
+            coalesce((details->>'e_sign')::boolean, false)
+        )
+        on conflict (user_id) do update set
+            contact_name = case when details ? 'contact_name' then excluded.contact_name else o.contact_name end,
+            contact_details = case when details ? 'contact_details' then excluded.contact_details else o.contact_details end,
+            company_name = case when details ? 'company_name' then excluded.company_name else o.company_name end,
+            address = case when details ? 'address' then excluded.address else o.address end,
+            id_number = case when details ? 'id_number' then excluded.id_number else o.id_number end,
+            citizenship = case when details ? 'citizenship' then excluded.citizenship else o.citizenship end,
+            company_tax_number = case when details ? 'company_tax_number' then excluded.company_tax_number else o.company_tax_number end,
+            email_address = case when details ? 'email_address' then excluded.email_address else o.email_address end,
+            mobile = case when details ? 'mobile' then excluded.mobile else o.mobile end,
+            efiling_login_details = case when details ? 'efiling_login_details' then excluded.efiling_login_details else o.efiling_login_details end,
+            e_sign = case when details ? 'e_sign' then excluded.e_sign else o.e_sign end;
+
+        delete from public.onboarding_drafts where user_id = uid;
+    end if;
+
+    if documents is not null then
+        insert into public.user_documents as d (user_id, doc_type, url, hash, size)
+        select
+            uid,
+            doc.key,
+            doc.value->>'url',
+            doc.value->>'hash',
+            coalesce(
+                (doc.value->>'size')::bigint,
+                (select s.size from public.user_documents s
+                 where s.user_id = uid and s.hash = doc.value->>'hash' and s.size is not null
+                 limit 1)
+            )
+        from jsonb_each(documents) as doc
+        on conflict (user_id, doc_type) do update set
+            url = excluded.url,
+            hash = excluded.hash,
+            size = excluded.size,
+            uploaded_at = now()
+        where (d.url, d.hash) is distinct from (excluded.url, excluded.hash);
+    end if;
+end;
+$$;
@@ -0,0 +1,79 @@
+# throttle.py
+
+import threading
+import time
+
+# Token buckets per auth action: scope -> (burst, refills per minute).
+# "email" is per address, "session" per browser session and "client" per client
+# IP address. There is deliberately no process-wide bucket: one client using it
+# up would lock every user out of signing in.
+AUTH_LIMITS = {
+    "login": {"email": (5, 5), "session": (10, 10), "client": (20, 20)},
+    "signup": {"email": (3, 1), "session": (5, 2), "client": (10, 6)},
+    "reset_password": {"email": (2, 0.5), "session": (3, 1), "client": (4, 2)},
+}
+
+# Buckets are pruned (full ones dropped) once this many are tracked.
+MAX_TRACKED_BUCKETS = 10000
+
+
+class RateLimited(Exception):
+    """
+    Raised when an action is attempted too often; retry_after is in seconds.
+    """
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class AuthThrottle:
+    """
+    In-process protection for Supabase Auth calls: token buckets per email,
+    per session and per client, so repeated presses and bots cannot exhaust
+    the project's auth rate limits.
+    """
+    def __init__(self, limits: dict = AUTH_LIMITS):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._buckets = {}  # (action, scope, key) -> (tokens, updated_at)
+
+    def _available(self, bucket: tuple, now: float) -> float:
+        burst, per_minute = self.limits[bucket[0]][bucket[1]]
+        tokens, updated_at = self._buckets.get(bucket, (burst, now))
+        return min(burst, tokens + (now - updated_at) * per_minute / 60)
+
+    def acquire(self, action: str, email: str, session_id: str, client: str):
+        """
+        Take one token from each of the action's buckets, or none of them.
+        Raises RateLimited with the time until every bucket has a token again.
+        """
+        now = time.monotonic()
+        keys = {"email": (email or "").strip().lower(), "session": session_id, "client": client}
+        buckets = [(action, scope, keys[scope]) for scope in self.limits[action]]
+        with self._lock:
+            available = {bucket: self._available(bucket, now) for bucket in buckets}
+            waits = [
+                (1 - tokens) * 60 / self.limits[action][bucket[1]][1]
+                for bucket, tokens in available.items() if tokens < 1
+            ]
+            if waits:
+                raise RateLimited(max(waits))
+            for bucket, tokens in available.items():
+                self._buckets[bucket] = (tokens - 1, now)
+            if len(self._buckets) > MAX_TRACKED_BUCKETS:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        for bucket in list(self._buckets):
+            if self._available(bucket, now) >= self.limits[bucket[0]][bucket[1]][0]:
+                del self._buckets[bucket]
+
+
+_auth_throttle = AuthThrottle()
+
+
+def get_auth_throttle() -> AuthThrottle:
+    """
+    Returns the process-wide throttle shared by all sessions.
+    """
+    return _auth_throttle
@@ -3,6 +3,10 @@
 import streamlit as st
 from supabase import Client
 
+import db
+import metrics
+
+@metrics.instrument_page("profile")
 def render_user_profile(supabase: Client):
     """
     Displays user profile info and allows updates if necessary.
@@ -10,8 +14,7 @@ def render_user_profile(supabase: Client):
     st.title("My Profile")
 
     user_id = st.session_state["user_id"]
-    user_details_response = supabase.table("user_onboarding").select("*").eq("user_id", user_id).execute()
-    user_details = user_details_response.data[0] if user_details_response.data else None
+    user_details = db.fetch_profile(supabase, user_id)
 
     if not user_details:
         st.info("No onboarding data found. Please complete onboarding first.")
@@ -34,5 +37,6 @@ def render_user_profile(supabase: Client):
             "mobile": new_mobile
         }
         supabase.table("user_onboarding").update(update_payload).eq("user_id", user_id).execute()
+        db.invalidate(user_id, "user_onboarding")
         st.success("Profile updated successfully!")
         st.rerun()